@@ -0,0 +1,83 @@
+"""
+The lists of contacts kept in each profile, described as data.
+
+Every category is a list of records under one key of the profile, with
+the fields given by its Category.  The storage, search and windows all
+work from SCHEMA, so a new category is a new entry there rather than new
+code.  CompletionCache remembers which categories of each profile have
+records, updated as profiles are saved.
+"""
+
+
+class Field(object):
+    """A field of a category's records."""
+    def __init__(self, key, label, missing='N/A'):
+        self.key = key
+        self.label = label
+        # Shown in the list when a record has no value for the field
+        self.missing = missing
+
+
+class Category(object):
+    """A list of records kept under key in each profile."""
+    def __init__(self, key, title, item, button, fields):
+        self.key = key
+        self.title = title
+        self.item = item
+        self.button = button
+        self.fields = fields
+
+    def records(self, profile):
+        return profile.get(self.key, [])
+
+    def row(self, record):
+        """Return the text of a record in the category's list."""
+        return ", ".join(
+            f"{field.label}: {record.get(field.key, field.missing)}"
+            for field in self.fields)
+
+    def complete(self, profile):
+        return len(self.records(profile)) > 0
+
+
+CONTACT_FIELDS = (Field('name', "Name"), Field('phone', "Phone"),
+                  Field('email', "Email"))
+
+SCHEMA = (
+    Category('contacts', "Contacts", "Contact", "Manage Contacts",
+             CONTACT_FIELDS),
+    Category('contact2s2', "contact2s2", "contact2", "Manage Contacts",
+             CONTACT_FIELDS),
+    Category('contact3s3', "contact3s3", "contact3", "Manage Contacts",
+             CONTACT_FIELDS),
+    Category('real_estate', "real_estate", "real_estate",
+             "Manage real_estate",
+             (Field('name', "Name"), Field('email', "Email", ''),
+              Field('phone', "Phone", ''))),
+)
+
+
+class CompletionCache(object):
+    """Which categories of each profile have records, by profile name."""
+    def __init__(self, schema=SCHEMA):
+        self.schema = schema
+        self.status = {}
+
+    def get(self, profile):
+        """Return a tuple of booleans, one per category of the schema."""
+        status = self.status.get(profile['name'])
+        if status is None:
+            status = self.update(profile)
+        return status
+
+    def update(self, profile):
+        """Recompute the status of a profile whose records changed."""
+        status = tuple(category.complete(profile) for category in self.schema)
+        self.status[profile['name']] = status
+        return status
+
+    def forget(self, name):
+        self.status.pop(name, None)
+
+    def clear(self):
+        self.status = {}
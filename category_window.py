@@ -0,0 +1,126 @@
+"""
+The window showing, adding and editing the records of one contact
+category (see categories.py).  There is one per category, reused for
+whichever profile it was last opened for.
+"""
+
+import tkinter as tk
+from tkinter import messagebox
+
+from virtual_list import VirtualListbox
+from profile_records import Contact
+
+
+class CategoryWindow(object):
+    """
+    The window listing one category's records for a profile.  It is made
+    once and reused: opening it for another profile just points it at that
+    profile's records.  save(profile) is called after every change, and
+    each (text, command) in actions adds a button calling command(profile).
+    """
+    def __init__(self, category, save, actions=()):
+        self.category = category
+        self.save = save
+        self.actions = actions
+        self.window = None
+        self.records_list = None
+        self.profile = None
+
+    def show(self, profile):
+        if self.window is None or not self.window.winfo_exists():
+            self.build()
+        self.profile = profile
+        self.window.title(f"{self.category.title} for Profile: "
+                          f"{profile['name']}")
+        self.records_list.selection_clear()
+        self.records_list.yview(tk.MOVETO, 0)
+        self.window.deiconify()
+        self.window.lift()
+
+    def refresh(self):
+        """Show the profile's records again after it changed elsewhere."""
+        if self.window is None or not self.window.winfo_exists():
+            return
+        self.window.title(f"{self.category.title} for Profile: "
+                          f"{self.profile['name']}")
+        self.records_list.refresh()
+
+    def close(self):
+        if self.window is not None and self.window.winfo_exists():
+            self.window.destroy()
+        self.window = None
+        self.profile = None
+
+    def build(self):
+        category = self.category
+        self.window = tk.Toplevel()
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        # Only the rows in view are put into the list
+        self.records_list = VirtualListbox(
+            self.window, lambda: len(self.records()),
+            lambda index: category.row(self.records()[index]),
+            width=50, height=20)
+        self.records_list.pack(side=tk.LEFT, fill=tk.Y)
+        tk.Button(self.window, text=f"Add {category.item}",
+                  command=self.add).pack(pady=5)
+        tk.Button(self.window, text=f"Edit {category.item}",
+                  command=self.edit).pack(pady=5)
+        for text, command in self.actions:
+            tk.Button(self.window, text=text,
+                      command=lambda command=command: command(self.profile)
+                      ).pack(pady=5)
+
+    def records(self):
+        if self.profile is None:
+            return []
+        return self.category.records(self.profile)
+
+    def add(self):
+        profile = self.profile
+
+        def save(values):
+            profile.setdefault(self.category.key, []).append(
+                Contact.from_dict(values))
+            self.save(profile)
+            if profile is self.profile:
+                self.records_list.row_inserted(len(self.records()) - 1)
+
+        self.open_form(f"Add {self.category.item}",
+                       f"Save {self.category.item}", {}, save)
+
+    def edit(self):
+        selected_index = self.records_list.curselection()
+        if not selected_index:
+            messagebox.showwarning(
+                f"No {self.category.item} Selected",
+                f"Please select a {self.category.item} to edit.")
+            return
+        profile = self.profile
+        record = self.records()[selected_index[0]]
+
+        def save(values):
+            record.update(values)
+            self.save(profile)
+            if profile is self.profile:
+                self.records_list.row_changed(selected_index[0])
+
+        self.open_form(f"Edit {self.category.item}", "Save Changes",
+                       record, save)
+
+    def open_form(self, title, button, record, save):
+        """A dialog with an entry per field, filled in from record."""
+        form = tk.Toplevel()
+        form.title(title)
+        entries = {}
+        for field in self.category.fields:
+            tk.Label(form, text=f"{field.label}:").pack(pady=10)
+            entry = tk.Entry(form)
+            entry.insert(0, record.get(field.key) or '')
+            entry.pack()
+            entries[field.key] = entry
+
+        def submit():
+            save({key: entry.get() for key, entry in entries.items()})
+            form.destroy()
+
+        tk.Button(form, text=button, command=submit).pack(pady=10)
@@ -0,0 +1,195 @@
+"""
+Storage for worlds too large to keep in memory as one dictionary.
+
+A world is a directory holding a world.json file (the size of the world
+and of its chunks) and one file per chunk, named "<cx>_<cy>.chunk", of
+chunk_size*chunk_size little endian float32 cell heights in row order.
+Chunks without a file are empty.  ChunkStore loads chunks as they are
+needed, keeps the most recently used in memory, and can read chunks on a
+background thread before they are needed.
+
+    python chunks.py generate big_world --size 4096 --seed 1
+"""
+
+import os
+import sys
+import json
+import queue
+import array
+import random
+import argparse
+import threading
+
+from collections import OrderedDict
+
+
+META_FILE = "world.json"
+CHUNK_TYPE = "f"
+DEFAULT_CHUNK_SIZE = 32
+DEFAULT_CACHE_SIZE = 64
+
+
+def chunk_path(path, key):
+    return os.path.join(path, "{}_{}.chunk".format(*key))
+
+
+def read_chunk(path, key, chunk_size):
+    """Return a chunk's cells as an array, or all zeros if it has no file."""
+    cells = array.array(CHUNK_TYPE)
+    try:
+        with open(chunk_path(path, key), "rb") as chunk_file:
+            cells.frombytes(chunk_file.read())
+    except (IOError, OSError):
+        return array.array(CHUNK_TYPE, bytes(4*chunk_size*chunk_size))
+    if sys.byteorder == "big":
+        cells.byteswap()
+    return cells
+
+
+def write_chunk(path, key, cells):
+    cells = array.array(CHUNK_TYPE, cells)
+    if sys.byteorder == "big":
+        cells.byteswap()
+    with open(chunk_path(path, key), "wb") as chunk_file:
+        chunk_file.write(cells.tobytes())
+
+
+def write_world(path, size, cell, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Create a world directory of the given size.  The cell argument is
+    called as cell(x, y) for every cell and returns its height.  Only one
+    chunk is held in memory at a time, and chunks with no walls are not
+    written at all.
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    with open(os.path.join(path, META_FILE), "w") as meta:
+        json.dump({"size": size, "chunk_size": chunk_size}, meta)
+    chunks = (size+chunk_size-1)//chunk_size
+    for cy in range(chunks):
+        for cx in range(chunks):
+            cells = []
+            for y in range(cy*chunk_size, (cy+1)*chunk_size):
+                for x in range(cx*chunk_size, (cx+1)*chunk_size):
+                    inside = x < size and y < size
+                    cells.append(cell(x, y) if inside else 0)
+            if any(cells):
+                write_chunk(path, (cx, cy), cells)
+
+
+class ChunkStore(object):
+    """
+    An LRU cache of the chunks of a world directory.  Cell lookups run on
+    the main thread without locking; chunks read by the prefetch thread are
+    handed over through a locked dictionary and only enter the cache when
+    collect() is called.
+    """
+    def __init__(self, path, cache_size=DEFAULT_CACHE_SIZE):
+        with open(os.path.join(path, META_FILE)) as meta:
+            info = json.load(meta)
+        self.path = path
+        self.size = info["size"]
+        self.chunk_size = info["chunk_size"]
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.last_key = None
+        self.last_chunk = None
+        self.lock = threading.Lock()
+        self.prefetched = {}
+        self.queued = set()
+        self.requests = queue.Queue()
+        self.thread = None
+
+    def get(self, x, y):
+        """Return the height of cell (x, y).  Both must be in the world."""
+        chunk_size = self.chunk_size
+        key = (x//chunk_size, y//chunk_size)
+        if key != self.last_key:
+            chunk = self.cache.get(key)
+            if chunk is None:
+                chunk = self.load(key)
+            else:
+                self.cache.move_to_end(key)
+            self.last_key = key
+            self.last_chunk = chunk
+        return self.last_chunk[(y % chunk_size)*chunk_size + x % chunk_size]
+
+    def load(self, key):
+        """Bring a chunk into the cache, evicting the least recently used."""
+        with self.lock:
+            chunk = self.prefetched.pop(key, None)
+            # Read here or taken early, so request() may prefetch it again
+            # once it is evicted.
+            self.queued.discard(key)
+        if chunk is None:
+            chunk = read_chunk(self.path, key, self.chunk_size)
+        self.cache[key] = chunk
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return chunk
+
+    def request(self, keys):
+        """Ask the prefetch thread to read any of these chunks not cached."""
+        chunks = (self.size+self.chunk_size-1)//self.chunk_size
+        for key in keys:
+            if key in self.cache or key in self.queued:
+                continue
+            if 0 <= key[0] < chunks and 0 <= key[1] < chunks:
+                self.queued.add(key)
+                self.requests.put(key)
+        if self.queued and self.thread is None:
+            self.thread = threading.Thread(target=self.prefetch)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def collect(self):
+        """Move chunks finished by the prefetch thread into the cache."""
+        with self.lock:
+            ready, self.prefetched = self.prefetched, {}
+        for key, chunk in ready.items():
+            self.queued.discard(key)
+            if key not in self.cache:
+                self.cache[key] = chunk
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        if self.last_key not in self.cache:
+            self.last_key = self.last_chunk = None
+
+    def prefetch(self):
+        while True:
+            key = self.requests.get()
+            if key is None:
+                break
+            chunk = read_chunk(self.path, key, self.chunk_size)
+            with self.lock:
+                self.prefetched[key] = chunk
+
+    def close(self):
+        if self.thread is not None:
+            self.requests.put(None)
+            self.thread.join()
+            self.thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a chunked world.")
+    subparsers = parser.add_subparsers(dest="command")
+    generate = subparsers.add_parser("generate",
+                                     help="generate a random world")
+    generate.add_argument("path")
+    generate.add_argument("--size", type=int, default=1024)
+    generate.add_argument("--chunk-size", type=int,
+                          default=DEFAULT_CHUNK_SIZE)
+    generate.add_argument("--density", type=float, default=0.3,
+                          help="chance of a cell containing a wall")
+    generate.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    if args.command != "generate":
+        parser.error("a command is required")
+    rng = random.Random(args.seed)
+    cell = lambda x, y: 1 if rng.random() < args.density else 0
+    write_world(args.path, args.size, cell, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
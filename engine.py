@@ -0,0 +1,1231 @@
+"""
+The ray casting engine shared by raycast.py and raycast_vary_height.py.
+
+The two games differ only in when a ray stops, how tall the cells of a
+generated map are, and their caption, assets and player speed.  A Mode
+bundles those choices, and each game is just a Mode handed to main():
+
+    first_hit   rays stop at the first wall, so nothing behind it is cast
+    full_range  rays run to the camera's range, so taller walls show
+                behind lower ones
+
+    flat_cell   walls all of height 1
+    varied_cell walls of a few different heights
+"""
+
+import os
+import sys
+import math
+import time
+import array
+import random
+import argparse
+import itertools
+import pygame as pg
+
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import hud
+import chunks
+import lights
+import pacing
+import replay
+
+if sys.version_info[0] == 2:
+    range = xrange
+
+SCREEN_SIZE = (1200, 600)
+CIRCLE = 2*math.pi
+SCALE = (SCREEN_SIZE[0]+SCREEN_SIZE[1])/1200.0
+FIELD_OF_VIEW = math.pi*0.4
+NO_WALL = float("inf")
+RAIN_COLOR = (255, 255, 255, 40)
+FLOOR_SIZE = (256, 256)
+
+# Semantically meaningful tuple for use in the Camera class.
+WallInfo = namedtuple("WallInfo", ["top", "height"])
+
+
+def first_hit(height):
+    """Stop a ray at the first wall it reaches."""
+    return height > 0
+
+
+def full_range(height):
+    """Never stop a ray early; walls behind walls may be taller."""
+    return False
+
+
+def flat_cell():
+    """A random cell: a wall of height 1 30% of the time."""
+    return 1 if random.random() < 0.3 else 0
+
+
+def varied_cell():
+    """A random cell: 30% of the time a wall of one of a few heights."""
+    if random.random() < 0.3:
+        return random.choice((0.6, 1, 1.5))
+    return 0
+
+
+class Mode(object):
+    """
+    A configuration of the engine: a game built on it.  The stop argument
+    is the ray termination policy and cell the height model used for
+    generated maps (see the functions above).  The knife, texture and sky
+    arguments are the image files loaded by load_resources(), and lights is
+    the number of point lights placed on a new game's map.
+    """
+    def __init__(self, caption, stop=first_hit, cell=flat_cell,
+                 knife="knife.png", texture="wall.jpg", sky="sky.jpg",
+                 player_speed=2.0, lights=0):
+        self.caption = caption
+        self.stop = stop
+        self.cell = cell
+        self.knife = knife
+        self.texture = texture
+        self.sky = sky
+        self.player_speed = player_speed
+        self.lights = lights
+
+    def make_map(self, size, wall_grid=None):
+        """Return a GameMap of this mode."""
+        return GameMap(size, wall_grid, self.stop, self.cell)
+
+    def make_chunked_map(self, path):
+        """Return a ChunkedGameMap of this mode."""
+        return ChunkedGameMap(path, stop=self.stop)
+
+
+class Image(object):
+    """A very basic class that couples an image with its dimensions"""
+    def __init__(self, image):
+        """
+        The image argument is a preloaded and converted pg.Surface object.
+        """
+        self.image = image
+        self.width, self.height = self.image.get_size()
+
+
+class Player(object):
+    """Handles the player's position, rotation, and control."""
+    def __init__(self, x, y, direction):
+        """
+        The arguments x and y are floating points.  Anything between zero
+        and the game map size is on our generated map.
+        Choosing a point outside this range ensures our player doesn't spawn
+        inside a wall.  The direction argument is the initial angle (given in
+        radians) of the player.
+        """
+        self.x = x
+        self.y = y
+        self.direction = direction
+        self.speed = 2.0  # Map cells per second, reduced speed.
+        self.rotate_speed = CIRCLE/2  # 180 degrees in a second.
+        self.weapon = Image(IMAGES["knife"])
+        self.paces = 0  # Used for weapon placement.
+
+    def rotate(self, angle):
+        """Change the player's direction when appropriate key is pressed."""
+        self.direction = (self.direction+angle+CIRCLE) % CIRCLE
+
+    def walk(self, distance, game_map):
+        """
+        Calculate the player's next position, and move if he will
+        not end up inside a wall.
+        """
+        dx = math.cos(self.direction)*distance
+        dy = math.sin(self.direction)*distance
+        if game_map.get(self.x+dx, self.y) <= 0:
+            self.x += dx
+        if game_map.get(self.x, self.y+dy) <= 0:
+            self.y += dy
+        self.paces += distance
+
+    def update(self, keys, dt, game_map):
+        """Execute movement functions if the appropriate key is pressed."""
+        if keys[pg.K_LEFT]:
+            self.rotate(-self.rotate_speed*dt)
+        if keys[pg.K_RIGHT]:
+            self.rotate(self.rotate_speed*dt)
+        if keys[pg.K_UP]:
+            self.walk(self.speed*dt, game_map)
+        if keys[pg.K_DOWN]:
+            self.walk(-self.speed*dt, game_map)
+
+
+class NPC(object):
+    """Handles the NPC's position, rotation, and basic AI."""
+    def __init__(self, x, y, direction):
+        self.x = x
+        self.y = y
+        self.direction = direction
+        self.speed = 1.5  # NPC speed is slightly slower than the player
+        self.paces = 0
+
+    def rotate(self, angle):
+        """Rotate the NPC in the specified direction."""
+        self.direction = (self.direction+angle+CIRCLE) % CIRCLE
+
+    def walk(self, distance, game_map):
+        """Move the NPC forward if it doesn't collide with a wall."""
+        dx = math.cos(self.direction)*distance
+        dy = math.sin(self.direction)*distance
+        if game_map.get(self.x+dx, self.y) <= 0:
+            self.x += dx
+        if game_map.get(self.x, self.y+dy) <= 0:
+            self.y += dy
+        self.paces += distance
+
+    def update(self, dt, game_map, player):
+        """Basic AI for the NPC to follow the player."""
+        angle_to_player = math.atan2(player.y - self.y, player.x - self.x)
+        self.direction = angle_to_player
+        self.walk(self.speed*dt, game_map)
+
+
+class GameMap(object):
+    """
+    A class to generate a random map for us; handle ray casting;
+    and provide a method of detecting collisions.
+    """
+    def __init__(self, size, wall_grid=None, stop=first_hit, cell=flat_cell):
+        """
+        The size argument is an integer which tells us the width and height
+        of our game grid.  For example, a size of 32 will create a 32x32 map.
+        A wall_grid (as returned by load_map) may be given instead of
+        generating one randomly.  Rays cast on the map end where stop(step)
+        is true, and a generated map's cells are made by calling cell().
+        """
+        self.size = size
+        self.stop = stop
+        self.cell = cell
+        if wall_grid is None:
+            wall_grid = self.randomize()
+        self.wall_grid = wall_grid
+        self.sky_box = Image(IMAGES["sky"])
+        self.wall_texture = Image(IMAGES["texture"])
+        self.floor_texture = Image(IMAGES["floor"])
+        self.ceiling_texture = None
+        self.light = 0
+        # Point lights, baked into the cells they light (see lights.py).
+        self.light_map = lights.LightMap(self.get)
+
+    def get(self, x, y):
+        """A method to check if a given coordinate is colliding with a wall."""
+        point = (int(math.floor(x)), int(math.floor(y)))
+        return self.wall_grid.get(point, -1)
+
+    def randomize(self):
+        """Generate our map randomly, one cell() per cell."""
+        coordinates = itertools.product(range(self.size), repeat=2)
+        return {coord: self.cell() for coord in coordinates}
+
+    def cast_ray(self, point, angle, cast_range, ray):
+        """
+        The meat of our ray casting program.  Given a point, an angle (in
+        radians), and a maximum cast range, find every grid line the ray
+        crosses and the cell behind it, writing them into ray, a RayBuffer
+        that is reused for every ray so casting creates no objects.
+        Casting will stop when the map's stop policy says so (at the first
+        wall, for first_hit), or our maximum casting range is exceeded.
+        Step 0 of the ray is the point itself.  Returns ray.
+        """
+        sin = math.sin(angle)
+        cos = math.cos(angle)
+        # Slopes of the ray, for steps to the next x and the next y line.
+        slope_x = sin/cos if cos else 0.0
+        slope_y = cos/sin if sin else 0.0
+        # Shift into the cell behind a line when moving left or up.
+        behind_x = 1 if cos < 0 else 0
+        behind_y = 1 if sin < 0 else 0
+        shading_x = 2 if cos < 0 else 0
+        shading_y = 2 if sin < 0 else 1
+        distances = ray.distances
+        heights = ray.heights
+        shadings = ray.shadings
+        offsets = ray.offsets
+        xs = ray.xs
+        ys = ray.ys
+        sides = ray.sides
+        capacity = ray.capacity
+        get = self.get
+        stop = self.stop
+        floor = math.floor
+        ceil = math.ceil
+        hypot = math.hypot
+        x, y = point
+        distance = 0.0
+        height = 0
+        distances[0] = heights[0] = offsets[0] = 0.0
+        shadings[0] = sides[0] = 0
+        xs[0] = x
+        ys[0] = y
+        count = 1
+        while not stop(height) and distance <= cast_range and count < capacity:
+            if cos:
+                x_dx = floor(x+1)-x if cos > 0 else ceil(x-1)-x
+                x_dy = x_dx*slope_x
+                length_x = hypot(x_dx, x_dy)
+            else:
+                length_x = NO_WALL
+            if sin:
+                y_dy = floor(y+1)-y if sin > 0 else ceil(y-1)-y
+                y_dx = y_dy*slope_y
+                length_y = hypot(y_dy, y_dx)
+            else:
+                length_y = NO_WALL
+            if length_x < length_y:
+                x += x_dx
+                y += x_dy
+                height = get(x-behind_x, y)
+                distance += length_x
+                shadings[count] = shading_x
+                offsets[count] = y-floor(y)
+                sides[count] = 0
+            else:
+                x += y_dx
+                y += y_dy
+                height = get(x, y-behind_y)
+                distance += length_y
+                shadings[count] = shading_y
+                offsets[count] = x-floor(x)
+                sides[count] = 1
+            heights[count] = height
+            distances[count] = distance
+            xs[count] = x
+            ys[count] = y
+            count += 1
+        ray.count = count
+        return ray
+
+    def update(self, dt):
+        """Adjust ambient lighting based on time."""
+        if self.light > 0:
+            self.light = max(self.light-10*dt, 0)
+        elif random.random()*5 < dt:
+            self.light = 2
+
+    def set_cell(self, x, y, height):
+        """Change the height of a cell, rebaking the lights around it."""
+        self.wall_grid[(x, y)] = height
+        self.light_map.wall_changed(x, y)
+
+    def place_lights(self, count):
+        """
+        Put count lights in random empty cells.  Cells are picked at random
+        rather than listed, so this is quick on any size of map; a map with
+        hardly any empty cells may get fewer lights.
+        """
+        for _ in range(count * 20):
+            if not count:
+                break
+            cell = random.randrange(self.size), random.randrange(self.size)
+            if self.get(*cell) <= 0 and cell not in self.light_map.lights:
+                self.light_map.add(lights.Light(*cell))
+                count -= 1
+
+    def stream(self, player):
+        """Nothing to do; the whole map is always in memory."""
+        pass
+
+
+class ChunkedGameMap(GameMap):
+    """
+    A GameMap whose walls are read from a chunked world directory (see
+    chunks.py) as they are needed, so only the area around the player is
+    held in memory.  Cells changed with set_cell are kept in wall_grid,
+    over the chunks, and are not written back to the world.
+    """
+    def __init__(self, path, cache_size=chunks.DEFAULT_CACHE_SIZE,
+                 stop=first_hit):
+        self.chunks = chunks.ChunkStore(path, cache_size)
+        self.lookahead = 2  # Chunks to prefetch in the direction of travel.
+        GameMap.__init__(self, self.chunks.size, wall_grid={}, stop=stop)
+
+    def get(self, x, y):
+        """A method to check if a given coordinate is colliding with a wall."""
+        x = int(math.floor(x))
+        y = int(math.floor(y))
+        if 0 <= x < self.size and 0 <= y < self.size:
+            if self.wall_grid:
+                height = self.wall_grid.get((x, y))
+                if height is not None:
+                    return height
+            return self.chunks.get(x, y)
+        return -1
+
+    def stream(self, player):
+        """
+        Take in any chunks finished loading in the background and request
+        those around the player, nearest first, followed by those ahead of
+        the player in the direction they are facing.
+        """
+        self.chunks.collect()
+        chunk_size = self.chunks.chunk_size
+        cx = int(player.x // chunk_size)
+        cy = int(player.y // chunk_size)
+        wanted = [(cx, cy)]
+        for dx, dy in itertools.product((-1, 0, 1), repeat=2):
+            wanted.append((cx+dx, cy+dy))
+        for step in range(1, self.lookahead+1):
+            ahead_x = player.x + math.cos(player.direction)*step*chunk_size
+            ahead_y = player.y + math.sin(player.direction)*step*chunk_size
+            wanted.append((int(ahead_x // chunk_size),
+                           int(ahead_y // chunk_size)))
+        self.chunks.request(wanted)
+
+
+class RayBuffer(object):
+    """
+    The steps of one ray, as written by GameMap.cast_ray(): for each step
+    the distance along the ray, the height of the cell reached, its shading
+    (which side of the cell was hit), the offset along that side, the point
+    where the ray crossed into the cell and whether that was across a line
+    of constant x (side 0) or y (side 1), in preallocated arrays.  Only the
+    first count entries are in use.  The arrays hold every step a ray
+    within cast_range can take, so one buffer is reused for every ray of
+    every frame.
+    """
+    def __init__(self, cast_range):
+        self.cast_range = cast_range
+        # A ray crosses at most (|sin|+|cos|)*distance <= sqrt(2)*distance
+        # grid lines, plus one of each kind to get started and the step
+        # beyond cast_range.
+        self.capacity = int(math.ceil((cast_range+2)*math.sqrt(2)))+2
+        zeros = [0]*self.capacity
+        self.distances = array.array("d", zeros)
+        self.heights = array.array("d", zeros)
+        self.shadings = array.array("b", zeros)
+        self.offsets = array.array("d", zeros)
+        self.xs = array.array("d", zeros)
+        self.ys = array.array("d", zeros)
+        self.sides = array.array("b", zeros)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+
+class Camera(object):
+    """Handles the projection and rendering of all objects on the screen."""
+    def __init__(self, screen, resolution):
+        self.screen = screen
+        self.width, self.height = self.screen.get_size()
+        self.resolution = float(resolution)
+        self.spacing = self.width / resolution
+        self.field_of_view = FIELD_OF_VIEW
+        self.range = 8
+        self.light_range = 5
+        self.scale = SCALE
+        self.rain = True
+        self.flash = pg.Surface((self.width, self.height // 2)).convert_alpha()
+        self.hud = hud.HUD((self.width, self.height), self.scale)
+        self.view_key = None
+        self.floor = np is not None
+        self.floor_rows_key = None
+        self.floor_distances = None
+        self.floor_columns = None
+        self.texels = {}
+        self.drops = {}
+        self.texture_columns = {}
+        self.ray = None
+        # Adaptive casting: cast every coarse_step'th column and only the
+        # columns between that lie across an edge (see draw_adaptive).  It
+        # is not used while it rains.
+        self.adaptive = False
+        self.coarse_step = 8
+        self.edge_threshold = 0.2
+        self.rays = []
+        self.rays_cast = 0
+
+
+    def render(self, player, game_map, npcs):
+        """
+        Render everything in order.  The 3D view is only drawn again if
+        something it shows has changed (rain changes it every frame, NPCs
+        only while they are in view).  Return a list of the screen
+        rectangles that changed, or None if the whole screen did.
+        """
+        npc_positions = tuple((npc.x, npc.y) for npc in npcs
+                              if self.npc_angle(npc, player) is not None)
+        view_key = (game_map, player.x, player.y, player.direction,
+                    game_map.light, npc_positions)
+        redraw = self.rain or view_key != self.view_key
+        self.view_key = view_key
+        if redraw:
+            self.draw_sky(player.direction, game_map.sky_box, game_map.light)
+            if self.floor:
+                self.draw_floor(player, game_map)
+            self.draw_columns(player, game_map)
+            self.draw_npcs(npcs, player)  # Pass player to draw_npcs method
+        dirty = self.hud.draw(self.screen, player, game_map, npcs, redraw)
+        return None if redraw else dirty
+
+    # Update the draw_npcs method to accept a player parameter
+    def draw_npcs(self, npcs, player):
+        """Draw all NPCs on the screen."""
+        npc_width = 20   # Width of the NPC character
+        npc_height = 40  # Height of the NPC character
+
+        for npc in npcs:
+            # Create a surface for the NPC
+            npc_image = pg.Surface((npc_width, npc_height), pg.SRCALPHA)
+            # Draw the body (a rectangle)
+            pg.draw.rect(npc_image, (0, 255, 0), (0, npc_height // 4, npc_width, npc_height * 3 // 4))
+            
+            # Draw the head (a circle)
+            pg.draw.ellipse(npc_image, (0, 200, 0), (npc_width // 4, 0, npc_width // 2, npc_height // 4))
+            
+            dx = npc.x - player.x
+            dy = npc.y - player.y
+            distance = math.hypot(dx, dy)
+            
+            angle_to_npc = self.npc_angle(npc, player)
+            if angle_to_npc is not None:
+                # Project the NPC onto the screen
+                projected_height = min(self.height // distance, self.height)
+                left = self.width / 2 + math.tan(angle_to_npc) * self.width / 2
+                
+                # Adjust the top position for height perspective, lowering the NPC
+                top = (self.height / 2) - (projected_height / 2)
+                
+                if 0 <= left < self.width:
+                    # Ensure the NPC is drawn within the screen boundaries
+                    self.screen.blit(npc_image, (left - npc_width // 2, top))
+
+    def npc_angle(self, npc, player):
+        """
+        Return the angle from the middle of the view to an NPC, or None if
+        it is out of the field of view or at the player's position, where
+        it isn't drawn.
+        """
+        dx = npc.x - player.x
+        dy = npc.y - player.y
+        if dx == 0 and dy == 0:
+            return None
+        angle = math.atan2(dy, dx) - player.direction
+        angle = (angle + math.pi) % (2 * math.pi) - math.pi
+        if abs(angle) < FIELD_OF_VIEW / 2:
+            return angle
+        return None
+
+    def draw_sky(self, direction, sky, ambient_light):
+        """
+        Calculate the skies offset so that it wraps, and draw.
+        If the ambient light is greater than zero, draw lightning flash.
+        """
+        left = -sky.width * direction / CIRCLE
+        self.screen.blit(sky.image, (left, 0))
+        if left < sky.width - self.width:
+            self.screen.blit(sky.image, (left + sky.width, 0))
+        if ambient_light > 0:
+            alpha = 255 * min(1, ambient_light * 0.1)
+            self.flash.fill((255, 255, 255, alpha))
+            self.screen.blit(self.flash, (0, self.height // 2))
+
+    def draw_floor(self, player, game_map):
+        """
+        Texture the floor (and the ceiling, if the map has one) below and
+        above the horizon.  Which point of the ground a pixel shows depends
+        on its row's distance and its column's ray, so those are computed
+        once by prepare_floor() and the texture lookup for every pixel is
+        done at once with numpy.  Requires numpy.
+        """
+        self.prepare_floor()
+        distances = self.floor_distances
+        angles = player.direction + self.floor_columns[0]
+        ray_x = np.cos(angles) / self.floor_columns[1]
+        ray_y = np.sin(angles) / self.floor_columns[1]
+        world_x = np.outer(ray_x.astype(np.float32), distances)
+        world_y = np.outer(ray_y.astype(np.float32), distances)
+        world_x += player.x
+        world_y += player.y
+        world_x -= np.floor(world_x)
+        world_y -= np.floor(world_y)
+        shade_value = distances / float(self.light_range) - game_map.light
+        shade = (256 * (1 - np.clip(shade_value, 0, 1))).astype(np.uint16)
+        half = len(distances)
+        textures = [(game_map.floor_texture, self.height - half)]
+        if game_map.ceiling_texture:
+            textures.append((game_map.ceiling_texture, 0))
+        for texture, top in textures:
+            texels = self.get_texels(texture)
+            texture_x = (world_x * texture.width).astype(np.intp)
+            texture_y = (world_y * texture.height).astype(np.intp)
+            # In float32, x - floor(x) is 1.0 for x just below zero.
+            np.minimum(texture_x, texture.width - 1, out=texture_x)
+            np.minimum(texture_y, texture.height - 1, out=texture_y)
+            texture_x *= texture.height
+            texture_x += texture_y
+            pixels = np.take(texels, texture_x, axis=0)
+            pixels *= shade[None, :, None]
+            pixels >>= 8
+            if top == 0:
+                pixels = pixels[:, ::-1]
+            rows = pg.surfarray.make_surface(pixels)
+            size = (self.width, half)
+            self.screen.blit(pg.transform.scale(rows, size), (0, top))
+
+    def prepare_floor(self):
+        """
+        Cache the distance to the ground seen by each row of pixels below
+        the horizon, and the angle and its cosine for each column.  Only
+        redone if the screen height or resolution changes.
+        """
+        key = (self.height, self.resolution)
+        if key == self.floor_rows_key:
+            return
+        self.floor_rows_key = key
+        horizon = self.height / 2.0
+        rows = np.arange(self.height // 2, self.height) + 0.5
+        distances = horizon / (rows - horizon)
+        self.floor_distances = distances.astype(np.float32)
+        columns = np.arange(int(self.resolution)) / self.resolution - 0.5
+        angles = self.field_of_view * columns
+        self.floor_columns = (angles, np.cos(angles))
+
+    def get_texels(self, texture):
+        """
+        Return (and cache) a texture's pixels as a flat array of colors,
+        indexed by x*height+y and widened so they can be multiplied by a
+        shade without overflowing.
+        """
+        if texture not in self.texels:
+            texels = pg.surfarray.array3d(texture.image).astype(np.uint16)
+            self.texels[texture] = texels.reshape(-1, 3)
+        return self.texels[texture]
+
+    def draw_columns(self, player, game_map):
+        """
+        For every column in the given resolution, cast a ray (or with
+        adaptive casting, find its walls from its neighbours') and find the
+        visible parts of its walls and rain.  They are drawn together once
+        every column is done, walls first so rain lands on top of them.
+        Rain falls on every step of a column's own ray, in column order, so
+        with rain every column is cast: a column found from its neighbours
+        has their steps, and casting out of order would change which random
+        numbers each column's drops get.
+        """
+        if self.ray is None or self.ray.cast_range != self.range:
+            self.ray = RayBuffer(self.range)
+            self.rays = []
+        walls = []
+        rain = []
+        self.rays_cast = 0
+        if self.adaptive and not self.rain:
+            self.draw_adaptive(player, game_map, walls, rain)
+        else:
+            for column in range(int(self.resolution)):
+                angle = self.cast_column(column, player, game_map, self.ray)
+                self.draw_column(column, self.ray, angle, game_map, walls,
+                                 rain)
+        self.screen.blits(walls, doreturn=False)
+        self.screen.blits(rain, doreturn=False)
+
+    def cast_column(self, column, player, game_map, ray):
+        """Cast the ray of a column into ray and return its angle."""
+        angle = self.field_of_view * (column / self.resolution - 0.5)
+        game_map.cast_ray((player.x, player.y), player.direction + angle,
+                          self.range, ray)
+        self.rays_cast += 1
+        return angle
+
+    def draw_adaptive(self, player, game_map, walls, rain):
+        """
+        Cast every coarse_step'th column and then, between each pair of
+        cast columns, cast the middle column and repeat on both halves
+        until the two edge rays hit the same sides of the same cells at
+        similar distances.  The columns between such a pair all look at
+        the same flat wall run, so their distances and texture offsets are
+        worked out from where the run's wall lines are, without casting.
+        Most of a frame is long flat walls, so few rays are cast beyond
+        the coarse ones.
+        """
+        last = int(self.resolution) - 1
+        left_ray, right_ray = self.ray_buffer(0), self.ray_buffer(1)
+        angle = self.cast_column(0, player, game_map, left_ray)
+        self.draw_column(0, left_ray, angle, game_map, walls, rain)
+        left = 0
+        while left < last:
+            right = min(left + self.coarse_step, last)
+            angle = self.cast_column(right, player, game_map, right_ray)
+            self.draw_column(right, right_ray, angle, game_map, walls, rain)
+            self.refine(left, left_ray, right, right_ray, 2, player,
+                        game_map, walls, rain)
+            left_ray, right_ray = right_ray, left_ray
+            left = right
+
+    def refine(self, left, left_ray, right, right_ray, depth, player,
+               game_map, walls, rain):
+        """Draw the columns strictly between two columns already drawn."""
+        if right - left < 2:
+            return
+        if self.same_walls(left_ray, right_ray):
+            ray = self.ray_buffer(depth)
+            for column in range(left + 1, right):
+                angle = self.fill_column(column, player, left_ray, ray)
+                self.draw_column(column, ray, angle, game_map, walls, rain)
+            return
+        middle = (left + right) // 2
+        middle_ray = self.ray_buffer(depth)
+        angle = self.cast_column(middle, player, game_map, middle_ray)
+        self.draw_column(middle, middle_ray, angle, game_map, walls, rain)
+        self.refine(left, left_ray, middle, middle_ray, depth + 1, player,
+                    game_map, walls, rain)
+        self.refine(middle, middle_ray, right, right_ray, depth + 1, player,
+                    game_map, walls, rain)
+
+    def ray_buffer(self, index):
+        """Return the index'th of the ray buffers used by draw_adaptive."""
+        while len(self.rays) <= index:
+            self.rays.append(RayBuffer(self.range))
+        return self.rays[index]
+
+    def same_walls(self, first, second):
+        """
+        Return True if two rays hit the same sides of the same cells, in
+        the same order, with distances within edge_threshold (relative) of
+        each other.
+        """
+        count = 0
+        index = 0
+        for first_index in range(first.count):
+            if first.heights[first_index] <= 0:
+                continue
+            count += 1
+            while index < second.count and second.heights[index] <= 0:
+                index += 1
+            if index == second.count:
+                return False
+            if (first.sides[first_index] != second.sides[index] or
+                    first.shadings[first_index] != second.shadings[index] or
+                    first.heights[first_index] != second.heights[index] or
+                    wall_cell(first, first_index) !=
+                    wall_cell(second, index)):
+                return False
+            first_distance = first.distances[first_index]
+            second_distance = second.distances[index]
+            nearer = min(first_distance, second_distance)
+            gap = abs(first_distance - second_distance)
+            if gap > self.edge_threshold * nearer:
+                return False
+            index += 1
+        while index < second.count:
+            if second.heights[index] > 0:
+                return False
+            index += 1
+        return True
+
+    def fill_column(self, column, player, template, ray):
+        """
+        Write the ray of a column into ray without casting it, from the ray
+        of a neighbouring column hitting the same walls: each wall is
+        where the column's ray meets the template's wall line.  The steps
+        through empty cells, which only place rain, are the template's.
+        Returns the column's angle.
+        """
+        angle = self.field_of_view * (column / self.resolution - 0.5)
+        direction = player.direction + angle
+        cos = math.cos(direction)
+        sin = math.sin(direction)
+        count = template.count
+        ray.distances[:count] = template.distances[:count]
+        ray.heights[:count] = template.heights[:count]
+        ray.shadings[:count] = template.shadings[:count]
+        ray.offsets[:count] = template.offsets[:count]
+        ray.sides[:count] = template.sides[:count]
+        ray.count = count
+        for index in range(count):
+            if template.heights[index] <= 0:
+                continue
+            if template.sides[index] == 0:
+                x = round(template.xs[index])
+                distance = (x - player.x) / cos
+                y = player.y + distance * sin
+                ray.offsets[index] = y - math.floor(y)
+            else:
+                y = round(template.ys[index])
+                distance = (y - player.y) / sin
+                x = player.x + distance * cos
+                ray.offsets[index] = x - math.floor(x)
+            ray.distances[index] = distance
+            ray.xs[index] = x
+            ray.ys[index] = y
+        return angle
+
+    def draw_column(self, column, ray, angle, game_map, walls, rain):
+        """
+        Examine each step of the ray, starting with the nearest.  Each wall
+        is clipped against the rows of the column that nearer walls already
+        cover, so only the rows still visible are scaled and shaded; they
+        are added to walls as (surface, position) pairs.  Once the column
+        is covered, walls further away are skipped.  Rain drops for every
+        step, furthest first, are clipped the same way and added to rain.
+        """
+        left = int(math.floor(column * self.spacing))
+        width = int(math.ceil(self.spacing))
+        full = ((0, self.height),)
+        covered = []
+        in_front = ()  # The rows covered by walls nearer than the step
+        hidden = []
+        heights = ray.heights
+        distances = ray.distances
+        levels = game_map.light_map.levels
+        for index in range(ray.count):
+            hidden.append(in_front)
+            if heights[index] > 0 and in_front != full:
+                distance = distances[index]
+                wall = self.project(heights[index], angle, distance)
+                top = int(wall.top)
+                bottom = min(top + wall.height, self.height)
+                # A wall is lit by the light in the cell in front of it
+                level = levels.get(front_cell(ray, index)) if levels else None
+                shade = self.shade(distance, ray.shadings[index],
+                                   game_map.light, level)
+                for span in visible_spans(covered, max(top, 0), bottom):
+                    walls.append(self.wall_span(ray.offsets[index], shade,
+                                                game_map, left, width, wall,
+                                                span))
+                cover(covered, max(top, 0), bottom)
+                in_front = tuple(covered)
+        if self.rain:
+            for index in range(ray.count - 1, -1, -1):
+                self.draw_rain(distances[index], angle, left, index,
+                               hidden[index], rain)
+
+    def wall_span(self, offset, shade, game_map, left, width, wall, span):
+        """
+        Return the rows span of a wall column, shaded, with where it goes.
+        The texture slice is scaled to the wall's full height, which is
+        cheap for a slice of one texel, so each row shows the same texel
+        as it would unclipped; only the span is shaded and drawn.
+        """
+        texture = game_map.wall_texture
+        texture_x = int(texture.width * offset)
+        image_slice = self.texture_column(texture, texture_x)
+        scaled = pg.transform.scale(image_slice, (width, wall.height))
+        start, end = span
+        area = pg.Rect(0, start - int(wall.top), width, end - start)
+        visible = scaled.subsurface(area)
+        if shade is not None:
+            visible.fill(shade, special_flags=pg.BLEND_MULT)
+        return visible, (left, start)
+
+    def texture_column(self, texture, texture_x):
+        """Return (and cache) a one texel wide column of a texture."""
+        key = (texture, texture_x)
+        column = self.texture_columns.get(key)
+        if column is None:
+            image_location = pg.Rect(texture_x, 0, 1, texture.height)
+            column = texture.image.subsurface(image_location)
+            self.texture_columns[key] = column
+        return column
+
+    def shade(self, distance, shading, light, level=None):
+        """
+        Return the color a wall column at a distance, on the side given by
+        shading, is multiplied by to darken it, or None if it is not
+        darkened.  Multiplying by the light left is the same as blending
+        black over the column, without an extra surface and blit.  A level
+        from the map's light map lifts the darkness of each channel by the
+        light falling on the wall.
+        """
+        shade_value = distance + shading
+        max_light = shade_value / float(self.light_range) - light
+        if level is None:
+            alpha = 255 * min(1, max(max_light, 0))
+            if alpha > 0:
+                return (int(255 - alpha),) * 3
+            return None
+        color = tuple(int(255 - 255 * min(1, max(max_light - channel, 0)))
+                      for channel in level)
+        return None if color == (255, 255, 255) else color
+
+    def draw_rain(self, distance, angle, left, ray_index, covered, rain):
+        """
+        Add a number of rain drops to add depth to our scene and mask
+        roughness.  Only the parts of drops not behind the covered rows are
+        kept.
+        """
+        rain_drops = int(random.random()**3 * ray_index)
+        if rain_drops:
+            drop = self.project(0.1, angle, distance)
+            for _ in range(rain_drops):
+                top = int(random.random() * drop.top)
+                bottom = min(top + drop.height, self.height)
+                for start, end in visible_spans(covered, top, bottom):
+                    rain.append((self.drop_image(end - start), (left, start)))
+
+    def drop_image(self, height):
+        """Return a rain drop of the given height, made once per height."""
+        drop = self.drops.get(height)
+        if drop is None:
+            drop = pg.Surface((1, height)).convert_alpha()
+            drop.fill(RAIN_COLOR)
+            self.drops[height] = drop
+        return drop
+
+    def project(self, height, angle, distance):
+        """
+        Find the position on the screen after perspective projection.
+        A minimum value is used for z to prevent slices blowing up to
+        unmanageable sizes when the player is very close.
+        """
+        z = max(distance * math.cos(angle), 0.2)
+        wall_height = self.height * height / float(z)
+        bottom = self.height / float(2) * (1 + 1 / float(z))
+        return WallInfo(bottom - wall_height, int(wall_height))
+
+
+def front_cell(ray, index):
+    """Return the cell a ray's step left: the one in front of its wall."""
+    if ray.sides[index] == 0:
+        line = int(round(ray.xs[index]))
+        if ray.shadings[index] == 0:  # Moving towards +x
+            line -= 1
+        return line, int(math.floor(ray.ys[index]))
+    line = int(round(ray.ys[index]))
+    if ray.shadings[index] == 1:  # Moving towards +y
+        line -= 1
+    return int(math.floor(ray.xs[index])), line
+
+
+def wall_cell(ray, index):
+    """
+    Return the side and shading of a ray's step and the grid line and cell
+    along it that the step crossed into.
+    """
+    if ray.sides[index] == 0:
+        line, along = ray.xs[index], ray.ys[index]
+    else:
+        line, along = ray.ys[index], ray.xs[index]
+    return (ray.sides[index], ray.shadings[index], round(line),
+            math.floor(along))
+
+
+def visible_spans(covered, top, bottom):
+    """
+    Return the parts of the rows top to bottom that are not in covered, a
+    sorted sequence of disjoint (top, bottom) spans, as (top, bottom) pairs.
+    """
+    spans = []
+    for start, end in covered:
+        if start >= bottom:
+            break
+        if end > top:
+            if start > top:
+                spans.append((top, start))
+            top = end
+            if top >= bottom:
+                return spans
+    if top < bottom:
+        spans.append((top, bottom))
+    return spans
+
+
+def cover(covered, top, bottom):
+    """Merge the rows top to bottom into the covered spans, in place."""
+    if top >= bottom:
+        return
+    index = 0
+    while index < len(covered) and covered[index][1] < top:
+        index += 1
+    end_index = index
+    while end_index < len(covered) and covered[end_index][0] <= bottom:
+        top = min(top, covered[end_index][0])
+        bottom = max(bottom, covered[end_index][1])
+        end_index += 1
+    covered[index:end_index] = [(top, bottom)]
+
+
+class Control(object):
+    """
+    The core of our program.  Responsible for running our main loop;
+    processing events; updating; and rendering.
+    """
+    def __init__(self, mode, recorder=None, world=None, adaptive=False,
+                 pacer=None, rain=True):
+        """
+        The mode is the Mode being played.  If a replay.InputRecorder is
+        passed, the keys and dt of every frame run by main_loop are written
+        to it.  The world argument is the path of a chunked world to play
+        in place of a random map.  With adaptive, the camera only casts the
+        rays it needs to find the edges of walls (see Camera.draw_adaptive),
+        except while it rains.
+        The pacer is the pacing.FramePacer that main_loop presents frames
+        with; by default frames are capped at 60 fps.  Without rain, the 3D
+        view is only redrawn when it changes (see Camera.render).
+        """
+        self.mode = mode
+        self.screen = pg.display.get_surface()
+        self.pacer = pacer or pacing.FramePacer()
+        self.fps = self.pacer.fps
+        self.keys = pg.key.get_pressed()
+        self.done = False
+        self.recorder = recorder
+        self.caption_interval = 0.5  # Seconds between caption updates.
+        self.caption_time = None
+        self.caption = None
+        self.player = Player(15.3, -1.2, math.pi*0.3)
+        self.player.speed = mode.player_speed
+        if world:
+            self.game_map = mode.make_chunked_map(world)
+        else:
+            self.game_map = mode.make_map(32)
+        self.camera = Camera(self.screen, 300)
+        self.camera.adaptive = adaptive
+        self.camera.rain = rain
+        self.game_map.place_lights(mode.lights)
+        self.npcs = []  # List to hold NPC objects
+        self.spawn_npcs_near_player()
+
+    def spawn_npcs_near_player(self):
+        """Spawn NPCs around the player."""
+        num_npcs = 5  # Number of NPCs to spawn
+        spawn_radius = 10  # Radius around the player to spawn NPCs
+
+        for _ in range(num_npcs):
+            # Generate random position within the spawn radius
+            angle = random.uniform(0, 2 * math.pi)
+            distance = random.uniform(0, spawn_radius)
+            npc_x = self.player.x + distance * math.cos(angle)
+            npc_y = self.player.y + distance * math.sin(angle)
+            
+            # Ensure NPCs spawn within map boundaries
+            npc_x = max(0, min(npc_x, self.game_map.size - 1))
+            npc_y = max(0, min(npc_y, self.game_map.size - 1))
+            
+            npc = NPC(npc_x, npc_y, random.uniform(0, 2 * math.pi))
+            self.npcs.append(npc)
+
+    def event_loop(self):
+        """
+        Quit game on a quit event and update self.keys on any keyup or keydown.
+        """
+        for event in pg.event.get():
+            if event.type == pg.QUIT:
+                self.done = True
+            elif event.type in (pg.KEYDOWN, pg.KEYUP):
+                self.keys = pg.key.get_pressed()
+
+    def update(self, dt):
+        """Update the game_map and player."""
+        self.game_map.update(dt)
+        self.player.update(self.keys, dt, self.game_map)
+        self.game_map.stream(self.player)
+        # Update NPCs
+        for npc in self.npcs:
+            npc.update(dt, self.game_map, self.player)
+
+    def display_fps(self):
+        """
+        Show the program's FPS, the spread of its frame times and the
+        deadlines it missed since the last update in the window handle.
+        Setting the caption is a call to the window manager, so it is only
+        done every caption_interval seconds, and only if the text has
+        changed.
+        """
+        now = pg.time.get_ticks()/1000.0
+        if self.caption_time is not None:
+            if now-self.caption_time < self.caption_interval:
+                return
+        self.caption_time = now
+        recent = self.pacer.recent
+        caption = "{} - FPS: {:.2f} - {:.1f} +/- {:.1f} ms - missed {}".format(
+            self.mode.caption, recent.fps(), recent.mean*1000,
+            recent.deviation()*1000, recent.missed)
+        recent.reset()
+        if caption != self.caption:
+            self.caption = caption
+            pg.display.set_caption(caption)
+
+    def main_loop(self):
+        """
+        Process events, update, and render.  Each frame is presented before
+        its time is measured, so dt is the time between presents: the time
+        the player actually saw each frame for.  While recording it is
+        rounded to what a recording holds, so the session replays exactly.
+        A summary of the frame times is printed at the end.
+        """
+        dt = self.pacer.start()
+        while not self.done:
+            self.event_loop()
+            if self.recorder:
+                dt = replay.recorded_dt(dt)
+                self.recorder.record(self.keys, dt)
+            self.update(dt)
+            dirty = self.camera.render(self.player, self.game_map, self.npcs)
+            self.pacer.wait()
+            if dirty is None:
+                pg.display.update()
+            elif dirty:
+                pg.display.update(dirty)
+            dt = self.pacer.presented()
+            self.display_fps()
+        print("Frame pacing ({}): {}".format(self.pacer.mode,
+                                             self.pacer.stats.summary()))
+
+    def replay_loop(self, recording, fixed_dt=None):
+        """
+        Run every frame of a replay.InputReplay as fast as possible, in place
+        of the keyboard and clock.  A fixed_dt (in seconds) overrides the
+        recorded frame times.  Yields a (checksum, update time, render time)
+        tuple for each frame, with times in seconds.
+        """
+        for keys, dt in recording:
+            self.keys = keys
+            start = time.perf_counter()
+            self.update(fixed_dt or dt)
+            updated = time.perf_counter()
+            self.camera.render(self.player, self.game_map, self.npcs)
+            rendered = time.perf_counter()
+            checksum = replay.frame_checksum(self.screen)
+            yield checksum, updated-start, rendered-updated
+
+
+def load_map(filename):
+    """
+    Read a map from a text file.  Each line is a row of the grid and each
+    character a cell; a digit greater than zero is a wall of that height.
+    Return the wall grid and the size of the smallest square holding it.
+    """
+    wall_grid = {}
+    with open(filename) as map_file:
+        rows = [line.rstrip("\n") for line in map_file if line.strip()]
+    for y, row in enumerate(rows):
+        for x, cell in enumerate(row):
+            wall_grid[(x, y)] = int(cell) if cell.isdigit() else 0
+    size = max(len(rows), max(len(row) for row in rows))
+    return wall_grid, size
+
+
+def load_resources(mode):
+    """
+    Return a dictionary of the images a mode needs; loaded, converted, and
+    scaled.
+    """
+    images = {}
+    knife_image = pg.image.load(mode.knife).convert_alpha()
+    knife_w, knife_h = knife_image.get_size()
+    knife_scale = (int(knife_w*SCALE), int(knife_h*SCALE))
+    images["knife"] = pg.transform.smoothscale(knife_image, knife_scale)
+    images["texture"] = pg.image.load(mode.texture).convert()
+    images["floor"] = pg.transform.smoothscale(images["texture"], FLOOR_SIZE)
+    sky_size = int(SCREEN_SIZE[0]*(CIRCLE/FIELD_OF_VIEW)), SCREEN_SIZE[1]
+    sky_box_image = pg.image.load(mode.sky).convert()
+    images["sky"] = pg.transform.smoothscale(sky_box_image, sky_size)
+    return images
+
+
+def run_replay(args, mode):
+    """
+    Replay a recording headlessly, optionally writing a line per frame with
+    its checksum and stage timings, and print a summary of the timings.
+    """
+    recording = replay.InputReplay(args.replay)
+    random.seed(recording.seed)
+    control = Control(mode, world=args.world, adaptive=args.adaptive,
+                      rain=not args.no_rain)
+    out = open(args.checksums, "w") if args.checksums else None
+    update_times = []
+    render_times = []
+    frames = control.replay_loop(recording, args.fixed_dt)
+    for frame, (checksum, update_time, render_time) in enumerate(frames):
+        update_times.append(update_time)
+        render_times.append(render_time)
+        if out:
+            line = "{} {:08x}".format(frame, checksum)
+            if args.timings:
+                line += " {:.3f} {:.3f}".format(update_time*1000,
+                                                render_time*1000)
+            out.write(line+"\n")
+    if out:
+        out.close()
+    if args.timings and update_times:
+        for name, times in (("update", update_times), ("render", render_times)):
+            mean = 1000*sum(times)/len(times)
+            print("{}: mean {:.3f} ms, max {:.3f} ms over {} frames".format(
+                name, mean, 1000*max(times), len(times)))
+
+
+def parse_args(mode):
+    parser = argparse.ArgumentParser(description=mode.caption)
+    parser.add_argument("--world", metavar="DIR",
+                        help="play in a chunked world made by chunks.py")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="only cast the rays needed to find wall edges "
+                             "(when it is not raining)")
+    parser.add_argument("--no-rain", action="store_true",
+                        help="turn the rain off, so that only frames that "
+                             "change are drawn (replays need the same "
+                             "setting as the recording)")
+    parser.add_argument("--pacing", choices=pacing.PACING_MODES,
+                        default="hybrid",
+                        help="how frames are paced (default: hybrid)")
+    parser.add_argument("--fps", type=float, default=60.0,
+                        help="frame rate to cap at, or of the display with "
+                             "vsync (default: 60)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="record keyboard input and frame times to FILE")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="replay a recording headlessly instead of playing")
+    parser.add_argument("--fixed-dt", type=float, metavar="SECONDS",
+                        help="use a fixed frame time when replaying")
+    parser.add_argument("--checksums", metavar="FILE",
+                        help="write per-frame checksums of a replay to FILE")
+    parser.add_argument("--timings", action="store_true",
+                        help="report update and render timings of a replay")
+    return parser.parse_args()
+
+
+def open_vsync_display():
+    """
+    Open the display synchronised to the monitor's refresh, and return the
+    pacing mode to use: "vsync", or "hybrid" if vsync is not available.
+    """
+    try:
+        pg.display.set_mode(SCREEN_SIZE, pg.SCALED, vsync=1)
+        return "vsync"
+    except (pg.error, TypeError):
+        print("Vsync is not available; pacing with hybrid instead.")
+        pg.display.set_mode(SCREEN_SIZE)
+        return "hybrid"
+
+
+def main(mode):
+    """Prepare the display, load images, and get a mode running."""
+    global IMAGES
+    args = parse_args(mode)
+    if args.replay:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_VIDEO_CENTERED"] = "True"
+    pg.init()
+    pacing_mode = args.pacing
+    if pacing_mode == "vsync" and not args.replay:
+        pacing_mode = open_vsync_display()
+    else:
+        pg.display.set_mode(SCREEN_SIZE)
+    IMAGES = load_resources(mode)
+    if args.replay:
+        run_replay(args, mode)
+    else:
+        pacer = pacing.FramePacer(pacing_mode, args.fps)
+        recorder = None
+        if args.record:
+            seed = random.SystemRandom().getrandbits(64)
+            random.seed(seed)
+            recorder = replay.InputRecorder(args.record, seed)
+        try:
+            Control(mode, recorder, args.world, args.adaptive, pacer,
+                    not args.no_rain).main_loop()
+        finally:
+            if recorder:
+                recorder.close()
+    pg.quit()
+    sys.exit()
@@ -0,0 +1,180 @@
+"""
+Golden image regression check for the renderer of engine.py, as used by
+raycast.py.
+
+Renders a fixed set of scenes headlessly, compares each against a stored
+PNG in the golden directory, and reports the difference, the frame
+checksum and how long the scene took to render.  Run with --update to
+regenerate the stored images after an intended visual change.  Scenes with
+lights have walls changed after the lights are placed, and also fail if
+the light rebaked for those changes differs from baking it afresh.
+
+    python golden.py
+    python golden.py --update
+    python golden.py --rain
+    python golden.py --adaptive
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import pygame as pg
+
+from collections import namedtuple
+
+import engine
+import lights
+import raycast
+import replay
+
+
+GOLDEN_DIR = "golden"
+MAP_FILE = "map.txt"
+RANDOM_MAP_SIZE = 32
+# A pixel channel counts as changed if it differs by more than this.
+CHANNEL_TOLERANCE = 8
+# Largest fraction of changed channels a scene may have and still pass.
+MAX_CHANGED = 0.001
+
+Scene = namedtuple("Scene", ["name", "map_seed", "x", "y", "direction",
+                             "lights", "edits"], defaults=((), ()))
+
+# A map_seed of None renders on map.txt; otherwise on a random map
+# generated from that seed.  Lights are the cells lights are placed in,
+# and edits the (x, y, height) cells set on the map after that.
+LIT_WALL = tuple((9, y, 1) for y in range(16, 25))
+SCENES = (
+    Scene("file_spawn", None, 15.3, -1.2, engine.CIRCLE*0.15),
+    Scene("file_wall", None, 17.5, 17.5, engine.CIRCLE*0.25),
+    Scene("file_open", None, 5.5, 20.5, 0.0),
+    Scene("random_spawn", 1, 15.3, -1.2, engine.CIRCLE*0.15),
+    Scene("random_inside", 2, 16.5, 16.5, engine.CIRCLE*0.6),
+    Scene("random_corner", 3, 0.5, 0.5, engine.CIRCLE*0.125),
+    Scene("file_lit", None, 5.5, 20.5, 0.0, lights=((7, 17), (7, 23)),
+          edits=LIT_WALL + ((9, 22, 0),)),
+)
+
+
+def make_map(scene):
+    """Return the GameMap a scene is rendered on, lit and edited."""
+    if scene.map_seed is None:
+        wall_grid, size = engine.load_map(MAP_FILE)
+        game_map = raycast.MODE.make_map(size, wall_grid)
+    else:
+        random.seed(scene.map_seed)
+        game_map = raycast.MODE.make_map(RANDOM_MAP_SIZE)
+    for x, y in scene.lights:
+        game_map.light_map.add(lights.Light(x, y))
+    for x, y, height in scene.edits:
+        game_map.set_cell(x, y, height)
+    return game_map
+
+
+def rebaked_correctly(game_map):
+    """
+    Return True if the light of a map matches baking all of its lights
+    again from scratch.
+    """
+    fresh = lights.LightMap(game_map.get)
+    for light in game_map.light_map.lights.values():
+        fresh.add(light)
+    levels = game_map.light_map.levels
+    if set(levels) != set(fresh.levels):
+        return False
+    return all(abs(a - b) < 1e-9 for cell, level in levels.items()
+               for a, b in zip(level, fresh.levels[cell]))
+
+
+def render_scene(scene, camera, rain, adaptive=False):
+    """
+    Render a scene to the camera's screen and return the time it took and
+    the map it was rendered on.  The random module is reseeded so rain is
+    the same on every run.
+    """
+    game_map = make_map(scene)
+    player = engine.Player(scene.x, scene.y, scene.direction)
+    camera.rain = rain
+    camera.adaptive = adaptive
+    random.seed(0)
+    start = time.perf_counter()
+    camera.render(player, game_map, [])
+    return time.perf_counter()-start, game_map
+
+
+def difference(surface, golden):
+    """
+    Return the fraction of color channels that differ from the golden image
+    by more than CHANNEL_TOLERANCE, and the largest single difference.
+    """
+    if surface.get_size() != golden.get_size():
+        return 1.0, 255
+    rendered = pg.image.tostring(surface, "RGB")
+    expected = pg.image.tostring(golden, "RGB")
+    if rendered == expected:
+        return 0.0, 0
+    diffs = [abs(a-b) for a, b in zip(rendered, expected)]
+    changed = sum(1 for diff in diffs if diff > CHANNEL_TOLERANCE)
+    return changed/float(len(diffs)), max(diffs)
+
+
+def golden_path(scene, rain):
+    suffix = "_rain" if rain else ""
+    return os.path.join(GOLDEN_DIR, "{}{}.png".format(scene.name, suffix))
+
+
+def run(update=False, rain=False, adaptive=False):
+    """Check (or with update, rewrite) every scene.  Return failure count."""
+    screen = pg.display.get_surface()
+    camera = engine.Camera(screen, 300)
+    failures = 0
+    for scene in SCENES:
+        elapsed, game_map = render_scene(scene, camera, rain, adaptive)
+        checksum = replay.frame_checksum(screen)
+        path = golden_path(scene, rain)
+        if scene.lights and not rebaked_correctly(game_map):
+            status = "FAIL light rebaked wrongly"
+            failures += 1
+        elif update:
+            pg.image.save(screen, path)
+            status = "updated"
+        elif not os.path.exists(path):
+            status = "MISSING"
+            failures += 1
+        else:
+            changed, largest = difference(screen, pg.image.load(path))
+            if changed > MAX_CHANGED:
+                status = "FAIL changed {:.4%} max {}".format(changed, largest)
+                failures += 1
+            else:
+                status = "ok"
+        print("{:<16} {:08x} {:8.2f} ms  {}".format(scene.name, checksum,
+                                                  elapsed*1000, status))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--update", action="store_true",
+                        help="rewrite the golden images from this renderer")
+    parser.add_argument("--rain", action="store_true",
+                        help="render with rain (seeded) enabled")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="render with adaptive column casting, which "
+                             "should stay within tolerance of the images "
+                             "(with --rain every column is still cast)")
+    args = parser.parse_args()
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pg.init()
+    pg.display.set_mode(engine.SCREEN_SIZE)
+    engine.IMAGES = engine.load_resources(raycast.MODE)
+    if args.update and not os.path.isdir(GOLDEN_DIR):
+        os.makedirs(GOLDEN_DIR)
+    failures = run(args.update, args.rain, args.adaptive)
+    pg.quit()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Compositing of the 2D overlays (the weapon and the minimap) that are drawn
+over the 3D view.
+
+Every layer caches its image and is only redrawn when what it shows has
+changed.  The HUD also keeps a copy of the view beneath each layer, so the
+layers can be redrawn on a frame where the 3D view was not, and reports the
+rectangles of the screen it changed so only those need to be presented.
+"""
+
+import math
+import pygame as pg
+
+
+MINIMAP_SIZE = 200
+MINIMAP_MARGIN = 10
+MINIMAP_BACKGROUND = (50, 50, 50)
+MINIMAP_WALL = (0, 0, 255)
+MINIMAP_PLAYER = (255, 0, 0)
+MINIMAP_NPC = (0, 255, 0)
+MARKER_RADIUS = 5
+# Larger maps show only this many cells around the player.
+MINIMAP_MAX_CELLS = 64
+
+
+class Layer(object):
+    """An overlay image, where it goes, and the part of the view it covers."""
+    def __init__(self):
+        self.image = None
+        self.key = None
+        self.position = None
+        self.rect = None
+        self.background = None
+        self.changed = True
+
+    def set(self, key, position, render):
+        """
+        Record the layer's position.  If key differs from the last call the
+        image is rebuilt by calling render() and the layer marked changed.
+        """
+        self.changed = key != self.key or position != self.position
+        if key != self.key:
+            self.image = render()
+            self.key = key
+        self.position = position
+
+
+class HUD(object):
+    """Composites the weapon and minimap layers onto the screen."""
+    def __init__(self, screen_size, scale):
+        self.width, self.height = screen_size
+        self.scale = scale
+        self.weapon = Layer()
+        self.minimap = Layer()
+        self.layers = (self.weapon, self.minimap)
+        self.minimap_walls = None
+        self.minimap_walls_key = None
+
+    def draw(self, screen, player, game_map, npcs, view_redrawn):
+        """
+        Bring every layer up to date and draw it.  If view_redrawn is False
+        the screen still holds the previous frame, so changed layers are
+        first erased by restoring the view saved beneath them.  Returns a
+        list of the screen rectangles that changed.
+        """
+        self.update_weapon(player.weapon, player.paces)
+        self.update_minimap(player, game_map, npcs)
+        changed = any(layer.changed for layer in self.layers)
+        if not view_redrawn and not changed:
+            return []
+        dirty = []
+        if not view_redrawn:
+            for layer in reversed(self.layers):
+                screen.blit(layer.background, layer.rect)
+                dirty.append(layer.rect)
+        screen_rect = screen.get_rect()
+        for layer in self.layers:
+            rect = layer.image.get_rect(topleft=layer.position)
+            layer.rect = rect.clip(screen_rect)
+            layer.background = screen.subsurface(layer.rect).copy()
+            screen.blit(layer.image, layer.position)
+            dirty.append(layer.rect)
+        return dirty
+
+    def update_weapon(self, weapon, paces):
+        """
+        Calculate new weapon position based on player's pace attribute.
+        """
+        bob_x = math.cos(paces * 2) * self.scale * 6
+        bob_y = math.sin(paces * 4) * self.scale * 6
+        left = int(self.width * 0.66 + bob_x)
+        top = int(self.height * 0.6 + bob_y)
+        self.weapon.set(weapon, (left, top), lambda: weapon.image)
+
+    def update_minimap(self, player, game_map, npcs):
+        """
+        Position the minimap in the top right corner of the screen and
+        redraw it if the player or any NPC has moved on it.
+        """
+        area = self.minimap_area(player, game_map)
+        left, top, cells = area
+        cell_size = MINIMAP_SIZE / cells
+        markers = []
+        for thing in [player] + list(npcs):
+            markers.append((int((thing.x - left) * cell_size),
+                            int((thing.y - top) * cell_size)))
+        key = (game_map, area, tuple(markers))
+        position = (self.width - MINIMAP_SIZE - MINIMAP_MARGIN, MINIMAP_MARGIN)
+        render = lambda: self.render_minimap(game_map, area, markers)
+        self.minimap.set(key, position, render)
+
+    def minimap_area(self, player, game_map):
+        """
+        Return the left and top cell and the width (in cells) of the part
+        of the map shown.  Small maps are shown whole; on larger ones the
+        area follows the player in steps of a quarter of its width, so the
+        walls are not redrawn every time the player moves.
+        """
+        if game_map.size <= MINIMAP_MAX_CELLS:
+            return 0, 0, game_map.size
+        step = MINIMAP_MAX_CELLS // 4
+        limit = game_map.size - MINIMAP_MAX_CELLS
+        corner = []
+        for position in (player.x, player.y):
+            start = int(position) - MINIMAP_MAX_CELLS // 2
+            corner.append(max(0, min(limit, start // step * step)))
+        return corner[0], corner[1], MINIMAP_MAX_CELLS
+
+    def render_minimap(self, game_map, area, markers):
+        """
+        Draw the minimap with the player (the first marker) and NPCs on it.
+        The walls are drawn once per map (or area of a large map) and reused.
+        """
+        if self.minimap_walls_key != (game_map, area):
+            self.minimap_walls = self.render_minimap_walls(game_map, area)
+            self.minimap_walls_key = (game_map, area)
+        minimap = self.minimap_walls.copy()
+        pg.draw.circle(minimap, MINIMAP_PLAYER, markers[0], MARKER_RADIUS)
+        for marker in markers[1:]:
+            pg.draw.circle(minimap, MINIMAP_NPC, marker, MARKER_RADIUS)
+        return minimap
+
+    def render_minimap_walls(self, game_map, area):
+        left, top, cells = area
+        minimap = pg.Surface((MINIMAP_SIZE, MINIMAP_SIZE))
+        minimap.fill(MINIMAP_BACKGROUND)
+        cell_size = MINIMAP_SIZE / cells
+        for x in range(cells):
+            for y in range(cells):
+                if game_map.get(left + x, top + y) > 0:
+                    cell = (x*cell_size, y*cell_size, cell_size, cell_size)
+                    pg.draw.rect(minimap, MINIMAP_WALL, cell)
+        return minimap
@@ -1,27 +1,165 @@
 import tkinter as tk
-from tkinter import messagebox, filedialog
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-import json
+from tkinter import messagebox, filedialog, ttk
 import os
+import queue
+import threading
+
+from profile_store import JournaledProfileStore, SQLiteProfileStore, AutosaveStore, save_to_json, JOURNAL_SUFFIX
+from profile_repository import ProfileRepository
+from profile_search import ProfileSearchIndex
+from virtual_list import VirtualListbox
+from categories import SCHEMA, CompletionCache
+from category_window import CategoryWindow
 
 # File paths
 PROFILES_FILE = "profiles.json"
-
-# Function to load profiles from JSON file
+PROFILES_DB = "profiles.db"
+
+# Storage backend: "json" or "sqlite" (set PROFILES_BACKEND to choose)
+BACKEND = os.environ.get("PROFILES_BACKEND", "json")
+
+# Function to open the storage backend
+def open_store():
+    if BACKEND == "sqlite":
+        sqlite_store = SQLiteProfileStore(PROFILES_DB)
+        # First run on SQLite: bring in the existing JSON profiles once,
+        # with any edits still in the journal rather than the snapshot
+        if sqlite_store.is_empty() and (
+                os.path.exists(PROFILES_FILE) or
+                os.path.exists(PROFILES_FILE + JOURNAL_SUFFIX)):
+            json_store = JournaledProfileStore(PROFILES_FILE)
+            try:
+                sqlite_store.import_profiles(json_store.load())
+            finally:
+                json_store.close()
+        return sqlite_store
+    # Changes are appended to a journal next to PROFILES_FILE and folded
+    # back into it in the background, instead of rewriting it on every save
+    return JournaledProfileStore(PROFILES_FILE)
+
+# The store and repository are opened by open_repository(), so importing
+# this module has no side effects
+store = None
+repository = None
+
+# Function to open the store and the repository over it. All profile
+# lookups and changes go through the repository, which keeps an index by
+# name so nothing has to scan the list, and a search index over the
+# profile and contact names, phone numbers and emails
+def open_repository():
+    global store, repository
+    # Saves are queued and written together on a background thread once
+    # editing pauses, so the window never waits on the disk
+    store = AutosaveStore(open_store())
+    repository = ProfileRepository(store, ProfileSearchIndex())
+    return repository
+
+# Names of the profiles matching the search box, or None to show them all
+search_results = None
+SEARCH_DELAY = 150  # ms to wait after a keystroke before searching
+search_after_id = None
+
+# Function to load every profile at once, for scripts
 def load_profiles():
-    if os.path.exists(PROFILES_FILE):
-        with open(PROFILES_FILE, "r") as file:
-            return json.load(file)
-    return []
-
-# Function to save profiles to JSON file
-def save_to_json(profiles, filename):
-    with open(filename, "w") as file:
-        json.dump(profiles, file, indent=4)
+    return repository.load()
+
+# Profiles are read on a background thread once the window is up and
+# added to the list in batches of this many
+LOAD_BATCH = 2000
+LOAD_POLL = 50  # ms between checks for loaded batches
+loading = False
+
+# Function to start loading the profiles into the list in the background
+def start_loading(root):
+    global loading
+    loading = True
+    repository.clear()
+    completion.clear()
+    batches = queue.Queue()
+
+    def read_profiles():
+        try:
+            profiles = store.load()
+            for i in range(0, len(profiles), LOAD_BATCH):
+                batches.put(profiles[i:i + LOAD_BATCH])
+            batches.put(None)
+        except Exception as error:
+            batches.put(error)
+
+    def add_batches():
+        global loading
+        while True:
+            try:
+                batch = batches.get_nowait()
+            except queue.Empty:
+                root.after(LOAD_POLL, add_batches)
+                return
+            if isinstance(batch, Exception):
+                loading = False
+                status_label.pack_forget()
+                messagebox.showerror("Load Error", f"Could not load the profiles: {batch}")
+                return
+            if batch is None:
+                loading = False
+                status_label.pack_forget()
+                reopen_category_windows()
+                if search_results is not None:
+                    run_search(search_var.get())
+                return
+            repository.extend(batch)
+            profiles_listbox.refresh()
+            status_label.config(text=f"Loading profiles... {len(repository)}")
+            # Give the window a turn before adding the next batch
+            root.after(1, add_batches)
+            return
 
-# Initialize profiles
-profiles = load_profiles()
+    threading.Thread(target=read_profiles, daemon=True).start()
+    add_batches()
+
+# Function to tell the user to wait for the profiles to load
+def check_loaded():
+    if loading:
+        messagebox.showwarning("Loading", "Profiles are still loading, try again in a moment.")
+        return False
+    return True
+
+# PDFs are generated by worker processes, started on the first export.
+# reportlab is only imported then, which keeps startup fast
+pdf_service = None
+
+def get_pdf_service():
+    global pdf_service
+    if pdf_service is None:
+        from profile_pdf import PdfExportService
+        pdf_service = PdfExportService()
+    return pdf_service
+
+# Functions giving the profiles listbox its rows: the search results if
+# there is a search, otherwise every profile
+def shown_count():
+    if search_results is None:
+        return len(repository)
+    return len(search_results)
+
+def shown_name(index):
+    if search_results is None:
+        return repository.name_at(index)
+    return search_results[index]
+
+# Function to filter the profiles listbox by the search box
+def run_search(query):
+    global search_results, search_after_id
+    search_after_id = None
+    search_results = repository.search(query)
+    profiles_listbox.selection_clear()
+    profiles_listbox.yview(tk.MOVETO, 0)
+
+# Function to search once typing pauses, instead of on every keystroke
+def schedule_search(root, query):
+    global search_after_id
+    if search_after_id is not None:
+        root.after_cancel(search_after_id)
+    search_after_id = root.after(SEARCH_DELAY, run_search, query)
 
 # Function to create a new profile
 def create_profile_window():
@@ -33,12 +171,14 @@ def create_profile_window():
     name_entry.pack()
 
     def save_profile():
+        if not check_loaded():
+            return
         profile_name = name_entry.get()
         if not profile_name:
             messagebox.showwarning("Input Error", "Profile name cannot be empty.")
             return
 
-        if any(p['name'] == profile_name for p in profiles):
+        if profile_name in repository:
             messagebox.showwarning("Profile Exists", f"Profile '{profile_name}' already exists.")
             return
 
@@ -47,9 +187,11 @@ def create_profile_window():
             'vehicles': [],
             'contacts': [],
         }
-        profiles.append(new_profile)
-        save_to_json(profiles, PROFILES_FILE)
-        profiles_listbox.insert(tk.END, profile_name)
+        index = repository.add(new_profile)
+        if search_results is None:
+            profiles_listbox.row_inserted(index)
+        else:
+            run_search(search_var.get())
         create_window.destroy()
 
     tk.Button(create_window, text="Save Profile", command=save_profile).pack(pady=10)
@@ -62,468 +204,321 @@ def delete_profile():
         return
 
     selected_index = selected_index[0]
-    selected_profile = profiles[selected_index]
+    selected_profile = repository.get(profiles_listbox.get(selected_index))
     
     # Confirm profile deletion
     confirm = messagebox.askyesno("Delete Profile", f"Are you sure you want to delete '{selected_profile['name']}'?")
     if confirm:
-        profiles.pop(selected_index)
-        save_to_json(profiles, PROFILES_FILE)
+        index = repository.delete(selected_profile['name'])
+        completion.forget(selected_profile['name'])
+        close_category_windows(selected_profile['name'])
+        if search_results is not None:
+            search_results.remove(selected_profile['name'])
+            index = selected_index
         
         # Update the listbox
-        profiles_listbox.delete(selected_index)
+        profiles_listbox.row_deleted(index)
         update_selected_profile_labels()  # Clear the labels after deletion
 
-def open_real_estate_window(profile_name):
-    profile = next((p for p in profiles if isinstance(p, dict) and p['name'] == profile_name), None)
-    if not profile:
-        messagebox.showwarning("Profile Not Found", f"Profile '{profile_name}' not found.")
-        return
-
-    real_estate_window = tk.Toplevel()
-    real_estate_window.title(f"real_estate for Profile: {profile_name}")
-
-    real_estate_list = tk.Listbox(real_estate_window, width=50, height=20)
-    real_estate_list.pack(side=tk.LEFT, fill=tk.Y)
-
-    scrollbar = tk.Scrollbar(real_estate_window)
-    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-    real_estate_list.configure(yscrollcommand=scrollbar.set)
-    scrollbar.configure(command=real_estate_list.yview)
-
-    def print_real_estate():
-        real_estate_list.delete(0, tk.END)
-        for real_estate in profile.get('real_estate', []):
-            real_estate_info = f"Name: {real_estate['name']}, Email: {real_estate.get('email', '')}, Phone: {real_estate.get('phone', '')}"
-            real_estate_list.insert(tk.END, real_estate_info)
-
-    def add_real_estate():
-        add_real_estate_window = tk.Toplevel()
-        add_real_estate_window.title("Add real_estate")
-
-        tk.Label(add_real_estate_window, text="Name:").pack(pady=10)
-        name_entry = tk.Entry(add_real_estate_window)
-        name_entry.pack()
-
-        tk.Label(add_real_estate_window, text="Email Address:").pack(pady=10)
-        email_entry = tk.Entry(add_real_estate_window)
-        email_entry.pack()
-
-        tk.Label(add_real_estate_window, text="Phone Number:").pack(pady=10)
-        phone_entry = tk.Entry(add_real_estate_window)
-        phone_entry.pack()
-
-        def save_real_estate():
-            if 'real_estate' not in profile:
-                profile['real_estate'] = []  # Initialize 'real_estate' list if it doesn't exist
-            real_estate = {
-                'name': name_entry.get(),
-                'email': email_entry.get(),
-                'phone': phone_entry.get()
-            }
-            profile['real_estate'].append(real_estate)
-            save_to_json(profiles, PROFILES_FILE)
-            messagebox.showinfo("Success", "real_estate added successfully!")
-            print_real_estate()  # Update the real_estate listbox after adding a new real_estate
-            add_real_estate_window.destroy()
-
-        tk.Button(add_real_estate_window, text="Save real_estate", command=save_real_estate).pack(pady=20)
-
-
-    def edit_real_estate():
-        selected_index = real_estate_list.curselection()
-        if selected_index:
-            selected_real_estate = profile['real_estate'][selected_index[0]]
-            edit_real_estate_window = tk.Toplevel()
-            edit_real_estate_window.title("Edit real_estate")
-
-            tk.Label(edit_real_estate_window, text="Name:").pack(pady=10)
-            name_entry_edit = tk.Entry(edit_real_estate_window)
-            name_entry_edit.insert(0, selected_real_estate['name'])
-            name_entry_edit.pack()
-
-            tk.Label(edit_real_estate_window, text="Email Address:").pack(pady=10)
-            email_entry_edit = tk.Entry(edit_real_estate_window)
-            email_entry_edit.insert(0, selected_real_estate.get('email', ''))
-            email_entry_edit.pack()
-
-            tk.Label(edit_real_estate_window, text="Phone Number:").pack(pady=10)
-            phone_entry_edit = tk.Entry(edit_real_estate_window)
-            phone_entry_edit.insert(0, selected_real_estate.get('phone', ''))
-            phone_entry_edit.pack()
-
-            def save_changes():
-                selected_real_estate['name'] = name_entry_edit.get()
-                selected_real_estate['email'] = email_entry_edit.get()
-                selected_real_estate['phone'] = phone_entry_edit.get()
-                save_to_json(profiles, PROFILES_FILE)
-                messagebox.showinfo("Success", "real_estate updated successfully!")
-                print_real_estate()  # Update the real_estate listbox after editing a real_estate
-                edit_real_estate_window.destroy()
-
-            tk.Button(edit_real_estate_window, text="Save Changes", command=save_changes).pack(pady=20)
-        else:
-            messagebox.showwarning("No real_estate Selected", "Please select a real_estate to edit.")
-
-    def generate_pdf():
-        pdf_filename = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")])
-        if pdf_filename:
-            c = canvas.Canvas(pdf_filename, pagesize=letter)
-            c.drawString(100, 750, f"Profile Information for: {profile_name}")
-            y_position = 720
-
-            # Print profile details
-            for key, value in profile.items():
-                if key == 'real_estate':
-                    continue  # Skip printing real_estate here
-                if isinstance(value, list) or isinstance(value, dict):
-                    value = json.dumps(value, indent=4)
-                profile_info = f"{key}: {value}"
-                c.drawString(100, y_position, profile_info)
-                y_position -= 20
-
-            # Print real_estate information
-            c.drawString(100, y_position, "real_estate:")
-            y_position -= 20
-            for real_estate in profile.get('real_estate', []):
-                real_estate_info = f"Name: {real_estate['name']}, Email: {real_estate.get('email', '')}, Phone: {real_estate.get('phone', '')}"
-                c.drawString(100, y_position, real_estate_info)
-                y_position -= 20
-
-            c.save()
-            messagebox.showinfo("PDF Generated", f"PDF generated successfully at {pdf_filename}")
-
-    tk.Button(real_estate_window, text="Add real_estate", command=add_real_estate).pack(pady=5)
-    tk.Button(real_estate_window, text="Edit real_estate", command=edit_real_estate).pack(pady=5)
-    tk.Button(real_estate_window, text="Generate PDF", command=generate_pdf).pack(pady=5)
-    
-    print_real_estate()
-
-# Function to open contacts window
-def open_contacts_window(profile_name):
-    profile = next((p for p in profiles if p['name'] == profile_name), None)
-    if not profile:
-        messagebox.showwarning("Profile Not Found", f"Profile '{profile_name}' not found.")
-        return
+# Which categories of each profile have records, kept up to date as
+# profiles are saved instead of being counted on every selection
+completion = CompletionCache()
 
-    contacts_window = tk.Toplevel()
-    contacts_window.title(f"Contacts for Profile: {profile_name}")
+# One window per contact category, made on first use and reused for
+# whichever profile it is opened for
+category_windows = {}
 
-    contacts_list = tk.Listbox(contacts_window, width=50, height=20)
-    contacts_list.pack(side=tk.LEFT, fill=tk.Y)
-
-    scrollbar = tk.Scrollbar(contacts_window)
-    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-    contacts_list.configure(yscrollcommand=scrollbar.set)
-    scrollbar.configure(command=contacts_list.yview)
-
-    def print_contacts():
-        contacts_list.delete(0, tk.END)
-        for contact in profile.get('contacts', []):
-            contact_info = f"Name: {contact['name']}, Phone: {contact.get('phone', 'N/A')}, Email: {contact.get('email', 'N/A')}"
-            contacts_list.insert(tk.END, contact_info)
-
-    def add_contact():
-        add_contact_window = tk.Toplevel()
-        add_contact_window.title("Add Contact")
-
-        tk.Label(add_contact_window, text="Name:").pack(pady=10)
-        name_entry = tk.Entry(add_contact_window)
-        name_entry.pack()
-
-        tk.Label(add_contact_window, text="Phone:").pack(pady=10)
-        phone_entry = tk.Entry(add_contact_window)
-        phone_entry.pack()
-
-        tk.Label(add_contact_window, text="Email:").pack(pady=10)
-        email_entry = tk.Entry(add_contact_window)
-        email_entry.pack()
-
-        def save_contact():
-            selected_index = profiles_listbox.curselection()
-            if selected_index:
-                selected_index = selected_index[0]  # Get the first selected item
-
-            if 'contacts' not in profile:
-                profile['contacts'] = []
-            new_contact = {
-                'name': name_entry.get(),
-                'phone': phone_entry.get(),
-                'email': email_entry.get()
-            }
-            profile['contacts'].append(new_contact)
-            save_to_json(profiles, PROFILES_FILE)
-            print_contacts()
-            add_contact_window.destroy()
-
-            if selected_index is not None:
-                profiles_listbox.selection_set(selected_index)  # Re-select the profile
-                profiles_listbox.activate(selected_index)  # Ensure the selection is active
-                update_selected_profile_labels()  # Update the labels for the re-selected profile
-
-        tk.Button(add_contact_window, text="Save Contact", command=save_contact).pack(pady=10)
-
-    tk.Button(contacts_window, text="Add Contact", command=add_contact).pack(pady=10)
-    print_contacts()
-
-
-def open_contact2s2_window(profile_name):
-    profile = next((p for p in profiles if p['name'] == profile_name), None)
+# Function to save a profile after its records changed
+def save_profile_records(profile):
+    repository.save(profile)
+    completion.update(profile)
+    selected_index = profiles_listbox.curselection()
+    if selected_index and profiles_listbox.get(selected_index[0]) == profile['name']:
+        update_selected_profile_labels()
+
+# Function to write the real_estate PDF of a profile
+def generate_real_estate_pdf(profile):
+    pdf_filename = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")])
+    if pdf_filename:
+        from profile_pdf import write_real_estate_pdf
+        write_real_estate_pdf(profile, pdf_filename)
+        messagebox.showinfo("PDF Generated", f"PDF generated successfully at {pdf_filename}")
+
+# Extra buttons of some category windows
+CATEGORY_ACTIONS = {
+    'real_estate': (("Generate PDF", generate_real_estate_pdf),),
+}
+
+# Function to open the window of a category for a profile
+def open_category_window(category, profile_name):
+    profile = repository.get(profile_name)
     if not profile:
         messagebox.showwarning("Profile Not Found", f"Profile '{profile_name}' not found.")
         return
-
-    contact2s2_window = tk.Toplevel()
-    contact2s2_window.title(f"contact2s2 for Profile: {profile_name}")
-
-    contact2s2_list = tk.Listbox(contact2s2_window, width=50, height=20)
-    contact2s2_list.pack(side=tk.LEFT, fill=tk.Y)
-
-    scrollbar = tk.Scrollbar(contact2s2_window)
-    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-    contact2s2_list.configure(yscrollcommand=scrollbar.set)
-    scrollbar.configure(command=contact2s2_list.yview)
-
-    def print_contact2s2():
-        contact2s2_list.delete(0, tk.END)
-        for contact2 in profile.get('contact2s2', []):
-            contact2_info = f"Name: {contact2['name']}, Phone: {contact2.get('phone', 'N/A')}, Email: {contact2.get('email', 'N/A')}"
-            contact2s2_list.insert(tk.END, contact2_info)
-
-    def add_contact2():
-        add_contact2_window = tk.Toplevel()
-        add_contact2_window.title("Add contact2")
-
-        tk.Label(add_contact2_window, text="Name:").pack(pady=10)
-        name_entry = tk.Entry(add_contact2_window)
-        name_entry.pack()
-
-        tk.Label(add_contact2_window, text="Phone:").pack(pady=10)
-        phone_entry = tk.Entry(add_contact2_window)
-        phone_entry.pack()
-
-        tk.Label(add_contact2_window, text="Email:").pack(pady=10)
-        email_entry = tk.Entry(add_contact2_window)
-        email_entry.pack()
-
-        def save_contact2():
-            selected_index = profiles_listbox.curselection()
-            if selected_index:
-                selected_index = selected_index[0]  # Get the first selected item
-
-            if 'contact2s2' not in profile:
-                profile['contact2s2'] = []
-            new_contact2 = {
-                'name': name_entry.get(),
-                'phone': phone_entry.get(),
-                'email': email_entry.get()
-            }
-            profile['contact2s2'].append(new_contact2)
-            save_to_json(profiles, PROFILES_FILE)
-            print_contact2s2()
-            add_contact2_window.destroy()
-
-            if selected_index is not None:
-                profiles_listbox.selection_set(selected_index)  # Re-select the profile
-                profiles_listbox.activate(selected_index)  # Ensure the selection is active
-                update_selected_profile_labels()  # Update the labels for the re-selected profile
-
-        tk.Button(add_contact2_window, text="Save contact2", command=save_contact2).pack(pady=10)
-
-    tk.Button(contact2s2_window, text="Add contact2", command=add_contact2).pack(pady=10)
-    print_contact2s2()
-
-def open_contact3s3_window(profile_name):
-    profile = next((p for p in profiles if p['name'] == profile_name), None)
-    if not profile:
-        messagebox.showwarning("Profile Not Found", f"Profile '{profile_name}' not found.")
+    window = category_windows.get(category.key)
+    if window is None:
+        window = CategoryWindow(category, save_profile_records, CATEGORY_ACTIONS.get(category.key, ()))
+        category_windows[category.key] = window
+    window.show(profile)
+
+# Function to point the category windows at the profiles just loaded,
+# closing those whose profile is gone
+def reopen_category_windows():
+    for window in category_windows.values():
+        if window.profile is None:
+            continue
+        profile = repository.get(window.profile['name'])
+        if profile is None:
+            window.close()
+        else:
+            window.profile = profile
+            window.refresh()
+
+# Function to close the category windows showing a deleted profile
+def close_category_windows(profile_name):
+    for window in category_windows.values():
+        if window.profile is not None and window.profile['name'] == profile_name:
+            window.close()
+
+# Other copies of the app may be changing the same profiles; their saves
+# are picked up this often (ms) and shown here
+CHANGES_POLL = 1000
+reload_wanted = False
+
+# Function to show the changes other copies of the app have saved
+def check_changes(root):
+    global reload_wanted
+    root.after(CHANGES_POLL, check_changes, root)
+    if loading:
         return
-
-    contact3s3_window = tk.Toplevel()
-    contact3s3_window.title(f"contact3s3 for Profile: {profile_name}")
-
-    contact3s3_list = tk.Listbox(contact3s3_window, width=50, height=20)
-    contact3s3_list.pack(side=tk.LEFT, fill=tk.Y)
-
-    scrollbar = tk.Scrollbar(contact3s3_window)
-    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-    contact3s3_list.configure(yscrollcommand=scrollbar.set)
-    scrollbar.configure(command=contact3s3_list.yview)
-
-    def print_contact3s3():
-        contact3s3_list.delete(0, tk.END)
-        for contact3 in profile.get('contact3s3', []):
-            contact3_info = f"Name: {contact3['name']}, Phone: {contact3.get('phone', 'N/A')}, Email: {contact3.get('email', 'N/A')}"
-            contact3s3_list.insert(tk.END, contact3_info)
-
-    def add_contact3():
-        add_contact3_window = tk.Toplevel()
-        add_contact3_window.title("Add contact3")
-
-        tk.Label(add_contact3_window, text="Name:").pack(pady=10)
-        name_entry = tk.Entry(add_contact3_window)
-        name_entry.pack()
-
-        tk.Label(add_contact3_window, text="Phone:").pack(pady=10)
-        phone_entry = tk.Entry(add_contact3_window)
-        phone_entry.pack()
-
-        tk.Label(add_contact3_window, text="Email:").pack(pady=10)
-        email_entry = tk.Entry(add_contact3_window)
-        email_entry.pack()
-
-        def save_contact3():
-            selected_index = profiles_listbox.curselection()
-            if selected_index:
-                selected_index = selected_index[0]  # Get the first selected item
-
-            if 'contact3s3' not in profile:
-                profile['contact3s3'] = []
-            new_contact3 = {
-                'name': name_entry.get(),
-                'phone': phone_entry.get(),
-                'email': email_entry.get()
-            }
-            profile['contact3s3'].append(new_contact3)
-            save_to_json(profiles, PROFILES_FILE)
-            print_contact3s3()
-            add_contact3_window.destroy()
-
-            if selected_index is not None:
-                profiles_listbox.selection_set(selected_index)  # Re-select the profile
-                profiles_listbox.activate(selected_index)  # Ensure the selection is active
-                update_selected_profile_labels()  # Update the labels for the re-selected profile
-
-        tk.Button(add_contact3_window, text="Save contact3", command=save_contact3).pack(pady=10)
-
-    tk.Button(contact3s3_window, text="Add contact3", command=add_contact3).pack(pady=10)
-    print_contact3s3()
+    records, conflicts = store.take_changes()
+    if reload_wanted or any(record['op'] == 'reload' for record in records):
+        # Too much changed to follow record by record.  Edits still queued
+        # here are saved first so the reload shows them; if that fails it
+        # is tried again on the next check rather than losing them
+        reload_wanted = True
+        try:
+            store.flush()
+        except Exception:
+            pass
+        else:
+            reload_wanted = False
+            start_loading(root)
+    elif records:
+        names = repository.apply_records(records)
+        for name in names:
+            completion.forget(name)
+            if name not in repository:
+                close_category_windows(name)
+        for window in category_windows.values():
+            if window.profile is not None and window.profile['name'] in names:
+                window.refresh()
+        if search_results is not None:
+            run_search(search_var.get())
+        else:
+            profiles_listbox.refresh()
+        update_selected_profile_labels()
+    if conflicts:
+        messagebox.showwarning("Profiles Changed Elsewhere", "Another copy of the app also changed: " + ", ".join(sorted(conflicts)) + "\nThe changes made here were kept.")
 
 # Function to update the labels based on the selected profile
 def update_selected_profile_labels():
     selected_index = profiles_listbox.curselection()
     if selected_index:
-        selected_profile = profiles[selected_index[0]]
-
-        vehicles_complete = selected_profile.get('vehicles', False)
-        housing_complete = selected_profile.get('housing', False)
-        housing2_complete = selected_profile.get('housing2', False)
-        contacts_complete = len(selected_profile.get('contacts', [])) > 0
-        contacts_complete2 = len(selected_profile.get('contact2s2', [])) > 0
-        contacts_complete3 = len(selected_profile.get('contact3s3', [])) > 0
-
-        contacts_label.config(text="Complete" if contacts_complete else "Incomplete", fg="green" if contacts_complete else "red")
-        contacts_label2.config(text="Complete" if contacts_complete2 else "Incomplete", fg="green" if contacts_complete2 else "red")
-        contacts_label3.config(text="Complete" if contacts_complete3 else "Incomplete", fg="green" if contacts_complete3 else "red")
+        status = completion.get(repository.get(profiles_listbox.get(selected_index[0])))
+    else:
+        status = (False,) * len(SCHEMA)
+    for label, complete in zip(category_labels, status):
+        label.config(text="Complete" if complete else "Incomplete", fg="green" if complete else "red")
 
 # Function to generate a PDF for the selected profile
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import utils
-
-from reportlab.lib.pagesizes import letter
-
 def generate_pdf():
     selected_index = profiles_listbox.curselection()
     if not selected_index:
         messagebox.showwarning("Selection Error", "No profile selected.")
         return
+    pdf_service = get_pdf_service()
+    if pdf_service.busy():
+        messagebox.showwarning("Export Running", "Wait for the PDF export in progress to finish.")
+        return
 
-    profile = profiles[selected_index[0]]
+    profile = repository.get(profiles_listbox.get(selected_index[0]))
     pdf_file = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")], initialfile=f"{profile['name']}_profile.pdf")
     
     if not pdf_file:
         return
 
-    # Create a canvas for the PDF
-    c = canvas.Canvas(pdf_file, pagesize=letter)
-    width, height = letter
-
-    # Define some margin and text wrapping configurations
-    margin_x = 50  # Left and right margin
-    margin_y = 50  # Top and bottom margin
-    max_text_width = width - 2 * margin_x  # Width available for text
-
-    # Start drawing the profile info
-    y = height - margin_y  # Starting position at the top of the page
-
-    # Utility function to wrap text to fit within the margins
-    def draw_wrapped_text(text, y, c, max_width, line_height=15):
-        lines = []
-        while text:
-            split_index = len(text)
-            while c.stringWidth(text[:split_index]) > max_width and split_index > 0:
-                split_index -= 1
-            lines.append(text[:split_index])
-            text = text[split_index:].lstrip()
-        for line in lines:
-            if y < margin_y:  # Check if we are running out of space on the page
-                c.showPage()  # Create a new page
-                y = height - margin_y  # Reset y position
-            c.drawString(margin_x, y, line)
-            y -= line_height
-        return y
-
-    # Draw profile name
-    y = draw_wrapped_text(f"Profile Name: {profile['name']}", y, c, max_text_width)
-
-    # Draw contacts
-    if profile.get('contacts'):
-        y = draw_wrapped_text("Contacts:", y - 20, c, max_text_width)
-        for contact in profile['contacts']:
-            # Separate name, phone, and email on different lines
-            y = draw_wrapped_text(f"Name: {contact['name']}", y - 10, c, max_text_width)
-            y = draw_wrapped_text(f"Phone: {contact.get('phone', 'N/A')}", y - 5, c, max_text_width)
-            y = draw_wrapped_text(f"Email: {contact.get('email', 'N/A')}", y - 5, c, max_text_width)
-            y -= 10  # Add extra spacing between different contacts
-    else:
-        y = draw_wrapped_text("Contacts: None", y - 20, c, max_text_width)
-
-    if profile.get('contact2s2'):
-        y = draw_wrapped_text("Contact2s2:", y - 20, c, max_text_width)
-        for contact in profile['contact2s2']:
-            # Separate name, phone, and email on different lines
-            y = draw_wrapped_text(f"Name: {contact['name']}", y - 10, c, max_text_width)
-            y = draw_wrapped_text(f"Phone: {contact.get('phone', 'N/A')}", y - 5, c, max_text_width)
-            y = draw_wrapped_text(f"Email: {contact.get('email', 'N/A')}", y - 5, c, max_text_width)
-            y -= 10  # Add extra spacing between different contacts
-    else:
-        y = draw_wrapped_text("Contacts: None", y - 20, c, max_text_width)
-    
-    if profile.get('contact3s3'):
-        y = draw_wrapped_text("Contact3s3:", y - 20, c, max_text_width)
-        for contact in profile['contact3s3']:
-            # Separate name, phone, and email on different lines
-            y = draw_wrapped_text(f"Name: {contact['name']}", y - 10, c, max_text_width)
-            y = draw_wrapped_text(f"Phone: {contact.get('phone', 'N/A')}", y - 5, c, max_text_width)
-            y = draw_wrapped_text(f"Email: {contact.get('email', 'N/A')}", y - 5, c, max_text_width)
-            y -= 10  # Add extra spacing between different contacts
-    else:
-        y = draw_wrapped_text("Contacts: None", y - 20, c, max_text_width)
+    # The PDF is drawn by a worker process so the window stays responsive
+    job = pdf_service.export_combined([profile], pdf_file)
 
-    # Draw vehicles section
-    vehicles_text = "Vehicles: Yes" if profile.get('vehicles') else "Vehicles: No"
-    y = draw_wrapped_text(vehicles_text, y - 20, c, max_text_width)
+    def check_done():
+        if not job.done():
+            profiles_listbox.after(100, check_done)
+            return
+        try:
+            job.result()
+        except Exception as error:
+            messagebox.showerror("PDF Error", f"Could not generate '{pdf_file}': {error}")
+            return
+        messagebox.showinfo("PDF Generated", f"PDF file '{pdf_file}' has been generated.")
 
-    # Draw housing section
-    housing_text = "Housing: Yes" if profile.get('housing') else "Housing: No"
-    y = draw_wrapped_text(housing_text, y - 20, c, max_text_width)
+    check_done()
 
-    # Draw housing2 section
-    housing2_text = "Housing2: Yes" if profile.get('housing2') else "Housing2: No"
-    y = draw_wrapped_text(housing2_text, y - 20, c, max_text_width)
+# Function to export many profiles to PDF at once: every profile, or only
+# the search results, into one PDF or one PDF per profile
+def open_batch_pdf_window():
+    if not check_loaded():
+        return
+    pdf_service = get_pdf_service()
+    if pdf_service.busy():
+        messagebox.showwarning("Export Running", "A PDF export is already in progress.")
+        return
 
-    # Save and close the PDF
-    c.save()
-    messagebox.showinfo("PDF Generated", f"PDF file '{pdf_file}' has been generated.")
+    batch_window = tk.Toplevel()
+    batch_window.title("Export PDFs")
+
+    mode = tk.StringVar(value="combined")
+    tk.Radiobutton(batch_window, text="One PDF with every profile", variable=mode, value="combined").pack(anchor="w", padx=10, pady=(10, 0))
+    tk.Radiobutton(batch_window, text="One PDF per profile", variable=mode, value="each").pack(anchor="w", padx=10)
+
+    only_results = tk.BooleanVar(value=search_results is not None)
+    only_results_button = tk.Checkbutton(batch_window, text="Only profiles matching the search", variable=only_results)
+    only_results_button.pack(anchor="w", padx=10, pady=5)
+    if search_results is None:
+        only_results_button.config(state=tk.DISABLED)
+
+    progress_bar = ttk.Progressbar(batch_window, length=300, mode="determinate")
+    progress_bar.pack(padx=10, pady=5)
+    status_label = tk.Label(batch_window, text="")
+    status_label.pack(padx=10)
+
+    buttons = tk.Frame(batch_window)
+    buttons.pack(pady=10)
+    job = None
+    poll = None  # The pending after() call of show_progress
+
+    def start_export():
+        nonlocal job
+        if only_results.get() and search_results is not None:
+            profiles = [repository.get(name) for name in search_results]
+        else:
+            profiles = list(repository)
+        if not profiles:
+            messagebox.showwarning("Nothing to Export", "There are no profiles to export.", parent=batch_window)
+            return
+        if mode.get() == "combined":
+            target = filedialog.asksaveasfilename(parent=batch_window, defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")], initialfile="profiles.pdf")
+            if not target:
+                return
+            job = pdf_service.export_combined(profiles, target)
+        else:
+            target = filedialog.askdirectory(parent=batch_window, title="Folder for the PDF files")
+            if not target:
+                return
+            job = pdf_service.export_each(profiles, target)
+        start_button.config(state=tk.DISABLED)
+        cancel_button.config(text="Cancel")
+        progress_bar.config(maximum=job.total)
+        show_progress(target)
+
+    def show_progress(target):
+        nonlocal poll
+        poll = None
+        progress_bar.config(value=job.progress())
+        status_label.config(text=f"{job.progress()} of {job.total} profiles")
+        if not job.done():
+            poll = batch_window.after(100, show_progress, target)
+            return
+        try:
+            written = job.result()
+        except Exception as error:
+            messagebox.showerror("PDF Error", f"The export failed: {error}", parent=batch_window)
+            return
+        finally:
+            cancel_button.config(text="Close")
+        if job.cancelled():
+            status_label.config(text=f"Cancelled after {written} of {job.total} profiles")
+        else:
+            status_label.config(text=f"{written} profiles exported to '{target}'")
+
+    def cancel_or_close():
+        if job is not None and not job.done():
+            job.cancel()
+        else:
+            batch_window.destroy()
+
+    # Closing the window cancels a running export and stops polling it, so
+    # nothing is left touching the destroyed widgets
+    def close_window():
+        if job is not None and not job.done():
+            job.cancel()
+        if poll is not None:
+            batch_window.after_cancel(poll)
+        batch_window.destroy()
+
+    batch_window.protocol("WM_DELETE_WINDOW", close_window)
+
+    start_button = tk.Button(buttons, text="Export", command=start_export)
+    start_button.pack(side=tk.LEFT, padx=5)
+    cancel_button = tk.Button(buttons, text="Close", command=cancel_or_close)
+    cancel_button.pack(side=tk.LEFT, padx=5)
+
+
+EXPORT_POLL = 100  # ms between checks on a running JSON export
+exporting = False
+
+# Function to export every profile to a JSON file
+def export_profiles():
+    global exporting
+    if not check_loaded():
+        return
+    if exporting:
+        messagebox.showwarning("Export Running", "A JSON export is already in progress.")
+        return
+    json_file = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON files", "*.json"), ("JSON Lines files", "*.jsonl")], initialfile="profiles_export.json")
+    if not json_file:
+        return
+    exporting = True
+    # The list of profiles is taken here; the file is written by a worker
+    # thread one profile at a time (a .jsonl file gets one per line), so
+    # the window keeps responding however many there are
+    profiles = list(repository)
+    progress = queue.Queue()
+
+    def write_profiles():
+        try:
+            save_to_json(profiles, json_file, progress.put)
+            progress.put(None)
+        except Exception as error:
+            progress.put(error)
+
+    def show_progress():
+        global exporting
+        while True:
+            try:
+                count = progress.get_nowait()
+            except queue.Empty:
+                status_label.after(EXPORT_POLL, show_progress)
+                return
+            if count is None or isinstance(count, Exception):
+                exporting = False
+                status_label.pack_forget()
+                if count is None:
+                    messagebox.showinfo("Export Complete", f"{len(profiles)} profiles exported to '{json_file}'.")
+                else:
+                    messagebox.showerror("Export Error", f"Could not export the profiles: {count}")
+                return
+            status_label.config(text=f"Exporting profiles... {count} of {len(profiles)}")
+
+    status_label.config(text=f"Exporting profiles... 0 of {len(profiles)}")
+    status_label.pack(side=tk.TOP, before=search_frame)
+    threading.Thread(target=write_profiles, daemon=True).start()
+    show_progress()
 
 
 # Main window function
 def open_main_window():
-    global profiles_listbox, vehicles_label, housing_label, housing_label2, contacts_label, contacts_label2, contacts_label3
+    global profiles_listbox, search_var, search_frame, status_label, category_labels
 
     root = tk.Tk()
     root.title("Profile Manager")
@@ -549,21 +544,21 @@ def open_main_window():
 
     content_frame.bind("<Configure>", update_scroll_region)
 
-    # Create a frame for the profiles listbox and scrollbar
-    profiles_frame = tk.Frame(content_frame)
-    profiles_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-    # Create a scrollbar for the profiles listbox
-    profiles_scrollbar = tk.Scrollbar(profiles_frame, orient="vertical")
-    profiles_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-    # Create the Listbox for profiles
-    profiles_listbox = tk.Listbox(profiles_frame, height=20, width=50, yscrollcommand=profiles_scrollbar.set)
+    # Search box; matches profile names and the names, phone numbers and
+    # emails of their contacts by prefix
+    search_frame = tk.Frame(content_frame)
+    search_frame.pack(side=tk.TOP, fill=tk.X)
+    tk.Label(search_frame, text="Search:").pack(side=tk.LEFT)
+    search_var = tk.StringVar()
+    tk.Entry(search_frame, textvariable=search_var).pack(side=tk.LEFT, fill=tk.X, expand=True)
+    search_var.trace_add("write", lambda *args: schedule_search(root, search_var.get()))
+
+    # Create the list of profiles; it has its own scrollbar and only puts
+    # the names in view into the listbox, so it opens instantly however
+    # many profiles there are
+    profiles_listbox = VirtualListbox(content_frame, shown_count, shown_name, height=20, width=50)
     profiles_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
-    # Configure the scrollbar for the listbox
-    profiles_scrollbar.config(command=profiles_listbox.yview)
-
     # Bind profile selection to update labels
     profiles_listbox.bind("<<ListboxSelect>>", lambda event: update_selected_profile_labels())
 
@@ -572,32 +567,51 @@ def open_main_window():
     tk.Button(content_frame, text="Delete Profile", command=delete_profile).pack(pady=5)  # Delete Profile Button
 
 
-    # Section: Contacts
-    contacts_frame = tk.Frame(content_frame)
-    contacts_frame.pack(pady=5)
-    tk.Button(contacts_frame, text="Manage Contacts", command=lambda: open_contacts_window(profiles_listbox.get(tk.ACTIVE))).pack(side=tk.LEFT)
-    contacts_label = tk.Label(contacts_frame, text="Incomplete", fg="red")
-    contacts_label.pack(side=tk.LEFT, padx=10)
-
-
-    contacts_frame2 = tk.Frame(content_frame)
-    contacts_frame2.pack(pady=5)
-    tk.Button(contacts_frame2, text="Manage Contacts", command=lambda: open_contact2s2_window(profiles_listbox.get(tk.ACTIVE))).pack(side=tk.LEFT)
-    contacts_label2 = tk.Label(contacts_frame2, text="Incomplete", fg="red")
-    contacts_label2.pack(side=tk.LEFT, padx=10)
-
-    contacts_frame3 = tk.Frame(content_frame)
-    contacts_frame3.pack(pady=5)
-    tk.Button(contacts_frame3, text="Manage Contacts", command=lambda: open_contact3s3_window(profiles_listbox.get(tk.ACTIVE))).pack(side=tk.LEFT)
-    contacts_label3 = tk.Label(contacts_frame3, text="Incomplete", fg="red")
-    contacts_label3.pack(side=tk.LEFT, padx=10)
+    # A row per contact category, with its completion status
+    category_labels = []
+    for category in SCHEMA:
+        category_frame = tk.Frame(content_frame)
+        category_frame.pack(pady=5)
+        tk.Button(category_frame, text=category.button, command=lambda category=category: open_category_window(category, profiles_listbox.get(tk.ACTIVE))).pack(side=tk.LEFT)
+        category_label = tk.Label(category_frame, text="Incomplete", fg="red")
+        category_label.pack(side=tk.LEFT, padx=10)
+        category_labels.append(category_label)
     # Button to generate PDF
     tk.Button(content_frame, text="Generate PDF", command=generate_pdf).pack(pady=10)
-
-    # Populate profiles listbox
-    for profile in profiles:
-        profiles_listbox.insert(tk.END, profile['name'])
+    tk.Button(content_frame, text="Export All PDFs", command=open_batch_pdf_window).pack(pady=5)
+    tk.Button(content_frame, text="Export JSON", command=export_profiles).pack(pady=5)
+
+    # Show the window first, then load the profiles into it
+    status_label = tk.Label(content_frame, text="Loading profiles...")
+    status_label.pack(side=tk.TOP, before=search_frame)
+    root.after_idle(start_loading, root)
+    root.after(CHANGES_POLL, check_changes, root)
+
+    # Write any queued changes before the window goes away
+    def close_window():
+        try:
+            store.flush()
+        except Exception as error:
+            if not messagebox.askyesno("Save Error", f"Could not save the latest changes: {error}\nQuit anyway?"):
+                return
+        root.destroy()
+
+    root.protocol("WM_DELETE_WINDOW", close_window)
 
     root.mainloop()
-
-open_main_window()
\ No newline at end of file
+    if pdf_service is not None:
+        pdf_service.close()
+    try:
+        store.close()
+    except Exception:
+        pass  # Already reported by close_window
+
+# Entry point: open the profiles and show the main window
+def main():
+    open_repository()
+    open_main_window()
+
+# Only open the window when run as a program: PDF worker processes may
+# import this module as __main__ when they start
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Baked lighting for the grid of a GameMap.
+
+Point lights sit in cells of the map.  The light each one casts on every
+empty cell within its radius that it can see is worked out once, when the
+light is added, and summed into levels: a dictionary from cell to the
+(red, green, blue) light falling on it, where 1.0 is a full channel.  The
+renderer looks walls' light up by the cell in front of them, so lighting
+costs one dictionary lookup per wall drawn.  Moving or changing a light,
+or a wall near one, rebakes only the lights it can affect.
+"""
+
+import math
+
+
+LIGHT_COLOR = (255, 214, 170)
+LIGHT_RADIUS = 5
+# Light is traced from cell to cell in steps of this many cells.
+TRACE_STEP = 0.25
+
+
+class Light(object):
+    """A point light in the middle of cell (x, y)."""
+    def __init__(self, x, y, color=LIGHT_COLOR, intensity=1.0,
+                 radius=LIGHT_RADIUS):
+        self.x = x
+        self.y = y
+        self.color = color
+        self.intensity = intensity
+        self.radius = radius
+
+    def reaches(self, x, y):
+        return (abs(x - self.x) <= self.radius
+                and abs(y - self.y) <= self.radius)
+
+
+class LightMap(object):
+    """
+    The light baked into the cells of a map.  The get argument is the
+    map's get(x, y), giving the height of a cell; cells of height above
+    zero are walls, which block light.
+    """
+    def __init__(self, get):
+        self.get = get
+        self.lights = {}
+        # Cell of each light to the {cell: (r, g, b)} it contributes.
+        self.contributions = {}
+        self.levels = {}
+
+    def __len__(self):
+        return len(self.lights)
+
+    def add(self, light):
+        """Add a light, replacing any other in its cell, and bake it."""
+        cell = (light.x, light.y)
+        if cell in self.lights:
+            self.remove(*cell)
+        self.lights[cell] = light
+        contribution = self.bake(light)
+        self.contributions[cell] = contribution
+        for lit, level in contribution.items():
+            total = self.levels.get(lit)
+            if total is not None:
+                level = tuple(a + b for a, b in zip(total, level))
+            self.levels[lit] = level
+
+    def remove(self, x, y):
+        """Remove the light in cell (x, y), if there is one."""
+        if (x, y) not in self.lights:
+            return
+        del self.lights[(x, y)]
+        contribution = self.contributions.pop((x, y))
+        # Summing what is left, rather than subtracting, keeps cells that
+        # no light reaches any more out of levels entirely.
+        for lit in contribution:
+            self.levels.pop(lit, None)
+            for other in self.contributions.values():
+                level = other.get(lit)
+                if level is not None:
+                    total = self.levels.get(lit)
+                    if total is not None:
+                        level = tuple(a + b for a, b in zip(total, level))
+                    self.levels[lit] = level
+
+    def wall_changed(self, x, y):
+        """Rebake the lights that may shine on or past cell (x, y)."""
+        for light in list(self.lights.values()):
+            if light.reaches(x, y):
+                self.add(light)
+
+    def bake(self, light):
+        """Return the {cell: (r, g, b)} light falls on from one light."""
+        contribution = {}
+        radius = light.radius
+        scale = [light.intensity * channel / 255.0 for channel in light.color]
+        for y in range(light.y - radius, light.y + radius + 1):
+            for x in range(light.x - radius, light.x + radius + 1):
+                distance = math.hypot(x - light.x, y - light.y)
+                if distance > radius or self.get(x, y) > 0:
+                    continue
+                if not self.visible(light.x, light.y, x, y, distance):
+                    continue
+                falloff = 1 - distance / float(radius + 1)
+                contribution[(x, y)] = tuple(channel * falloff
+                                             for channel in scale)
+        return contribution
+
+    def visible(self, x0, y0, x1, y1, distance):
+        """
+        Return True if no wall lies on the line between the middles of
+        cells (x0, y0) and (x1, y1).
+        """
+        steps = int(distance / TRACE_STEP)
+        for step in range(1, steps):
+            t = step / float(steps)
+            x = x0 + 0.5 + (x1 - x0) * t
+            y = y0 + 0.5 + (y1 - y0) * t
+            if self.get(x, y) > 0:
+                return False
+        return True
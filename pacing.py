@@ -0,0 +1,128 @@
+"""
+Frame pacing for the main loop.
+
+A FramePacer decides when each frame is presented and measures the time
+between presents, which is the dt the next frame is updated with.  The
+modes are:
+
+    uncapped  present every frame as soon as it is drawn
+    busy      cap at fps, spinning on the clock until each frame's deadline
+    hybrid    cap at fps, sleeping until just before each deadline and
+              spinning the rest, which is as even as busy without keeping
+              a core busy for the whole wait
+    vsync     present on the display's refresh; the display waits for it
+
+Deadlines are fixed steps of 1/fps apart rather than measured from the
+last frame, so a frame that is a little late does not push back every
+frame after it.  Frame times are recorded in FrameStats, and a frame that
+took more than half a period longer than it should have (so that at
+60 fps it was shown for at least two refreshes) counts as a missed
+deadline.
+"""
+
+import math
+import time
+
+
+PACING_MODES = ("uncapped", "busy", "hybrid", "vsync")
+# Seconds before a deadline that the hybrid mode stops sleeping and spins;
+# sleeps can overshoot by about this much.
+SPIN_MARGIN = 0.002
+# A frame longer than (1+MISS_TOLERANCE) periods missed its deadline.
+MISS_TOLERANCE = 0.5
+
+
+class FrameStats(object):
+    """The count, mean, variance, worst and missed deadlines of frames."""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.squares = 0.0  # Sum of squared differences from the mean
+        self.worst = 0.0
+        self.missed = 0
+
+    def add(self, frame_time, missed=False):
+        self.count += 1
+        delta = frame_time - self.mean
+        self.mean += delta / self.count
+        self.squares += delta * (frame_time - self.mean)
+        self.worst = max(self.worst, frame_time)
+        if missed:
+            self.missed += 1
+
+    def variance(self):
+        return self.squares / self.count if self.count else 0.0
+
+    def deviation(self):
+        return math.sqrt(self.variance())
+
+    def fps(self):
+        return 1 / self.mean if self.mean else 0.0
+
+    def summary(self):
+        return ("{} frames, mean {:.2f} ms, deviation {:.2f} ms, worst "
+                "{:.2f} ms, {} missed deadlines".format(
+                    self.count, self.mean * 1000, self.deviation() * 1000,
+                    self.worst * 1000, self.missed))
+
+
+class FramePacer(object):
+    """
+    Paces the frames of a main loop.  Call start() before the first frame,
+    wait() once a frame is drawn, then present it and call presented().
+    The clock and sleep arguments are for timing with something other than
+    time.perf_counter and time.sleep.
+    """
+    def __init__(self, mode="hybrid", fps=60.0, clock=time.perf_counter,
+                 sleep=time.sleep):
+        if mode not in PACING_MODES:
+            raise ValueError("Unknown pacing mode {!r}.".format(mode))
+        self.mode = mode
+        self.fps = fps
+        self.period = 1.0 / fps
+        self.clock = clock
+        self.sleep = sleep
+        self.deadline = None
+        self.last_present = None
+        self.stats = FrameStats()  # Every frame since start()
+        self.recent = FrameStats()  # Reset by whoever displays them
+
+    def start(self):
+        """Start timing.  Returns the dt to update the first frame with."""
+        now = self.clock()
+        self.last_present = now
+        self.deadline = now + self.period
+        self.stats.reset()
+        self.recent.reset()
+        return self.period
+
+    def wait(self):
+        """In the capped modes, wait for the frame's deadline."""
+        if self.mode == "hybrid":
+            remaining = self.deadline - self.clock() - SPIN_MARGIN
+            if remaining > 0:
+                self.sleep(remaining)
+        if self.mode in ("busy", "hybrid"):
+            while self.clock() < self.deadline:
+                pass
+
+    def presented(self):
+        """
+        Record that a frame was just presented.  Returns the time since the
+        last one, in seconds: the dt to update the next frame with.
+        """
+        now = self.clock()
+        frame_time = now - self.last_present
+        self.last_present = now
+        missed = frame_time > self.period * (1 + MISS_TOLERANCE)
+        self.stats.add(frame_time, missed)
+        self.recent.add(frame_time, missed)
+        self.deadline += self.period
+        if self.deadline < now:
+            # Too far behind to catch up; start the cadence again from now
+            # rather than rushing out frames to make up the time.
+            self.deadline = now + self.period
+        return frame_time
@@ -0,0 +1,257 @@
+"""
+Headless benchmark and test data generator for the profile manager.
+
+generate writes a file of synthetic profiles (any format profile_store.py
+reads).  run times the data layer at each size given, for each storage
+backend: loading (store and search index), lookups, searches, adds,
+saves, deletes and closing the store, plus PDF generation, and reports the
+throughput of each and the peak memory of a load.  Nothing opens a window.
+
+    python profile_bench.py generate big.jsonl --profiles 100000
+    python profile_bench.py run --sizes 1000 10000 100000
+    python profile_bench.py run --backends sqlite --ops 200
+"""
+
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+from profile_store import (JournaledProfileStore, SQLiteProfileStore,
+                           AutosaveStore, save_to_json)
+from profile_repository import ProfileRepository
+from profile_search import ProfileSearchIndex
+from categories import SCHEMA
+
+
+BACKENDS = ("json", "sqlite", "autosave")
+FIRST_NAMES = ("ann", "bob", "carla", "dev", "erin", "farid", "gus", "hana",
+               "ivan", "jo", "kim", "luis", "mara", "ned", "olga", "pia")
+LAST_NAMES = ("smith", "jones", "garcia", "chen", "okafor", "novak", "silva",
+              "kowalski", "ahmed", "berg", "costa", "dubois", "evans")
+STREETS = ("oak", "elm", "main", "high", "mill", "park", "lake", "hill")
+
+
+def person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def contact(rng):
+    name = person(rng)
+    return {'name': name,
+            'phone': f"555-{rng.randrange(10000000):07d}",
+            'email': name.replace(" ", ".") + "@example.com"}
+
+
+def real_estate(rng):
+    street = rng.choice(STREETS)
+    return {'name': f"{rng.randrange(1, 999)} {street} street",
+            'email': f"agent.{street}@example.com",
+            'phone': f"555-{rng.randrange(10000000):07d}"}
+
+
+def generate_profiles(count, contacts=3, real_estates=1, seed=0):
+    """
+    Yield count synthetic profiles, each with contacts records in every
+    contact category and real_estates real estate records.
+    """
+    rng = random.Random(seed)
+    for number in range(count):
+        profile = {'name': f"{person(rng)} {number}",
+                   'vehicles': rng.random() < 0.5,
+                   'housing': rng.random() < 0.5,
+                   'housing2': rng.random() < 0.5}
+        for category in SCHEMA:
+            if category.key == 'real_estate':
+                profile[category.key] = [real_estate(rng)
+                                         for _ in range(real_estates)]
+            else:
+                profile[category.key] = [contact(rng)
+                                         for _ in range(contacts)]
+        yield profile
+
+
+def open_backend(backend, directory):
+    if backend == "sqlite":
+        return SQLiteProfileStore(os.path.join(directory, "profiles.db"))
+    store = JournaledProfileStore(os.path.join(directory, "profiles.json"))
+    if backend == "autosave":
+        return AutosaveStore(store)
+    return store
+
+
+def prepare(backend, directory, size, args):
+    """Write size profiles where the backend will load them from."""
+    profiles = generate_profiles(size, args.contacts, args.real_estate,
+                                 args.seed)
+    if backend == "sqlite":
+        store = SQLiteProfileStore(os.path.join(directory, "profiles.db"))
+        store.import_profiles(profiles)
+        store.close()
+    else:
+        save_to_json(profiles, os.path.join(directory, "profiles.json"))
+
+
+def timed(results, name, count, function):
+    start = time.perf_counter()
+    function()
+    results.append((name, count, time.perf_counter() - start))
+
+
+def bench_backend(backend, size, args):
+    """Return (operation, count, seconds) for each operation timed."""
+    directory = tempfile.mkdtemp(prefix="profile_bench_")
+    try:
+        prepare(backend, directory, size, args)
+        rng = random.Random(args.seed)
+        results = []
+        store = open_backend(backend, directory)
+        repository = ProfileRepository(store, ProfileSearchIndex())
+        timed(results, "load", size, repository.load)
+        names = [profile['name'] for profile in repository]
+        ops = min(args.ops, size)
+
+        lookups = [rng.choice(names) for _ in range(ops * 10)]
+        timed(results, "lookup", len(lookups),
+              lambda: [repository.get(name) for name in lookups])
+        queries = [rng.choice(FIRST_NAMES)[:2] + " " + rng.choice(LAST_NAMES)
+                   for _ in range(ops)]
+        timed(results, "search", len(queries),
+              lambda: [repository.search(query) for query in queries])
+
+        new_profiles = list(generate_profiles(ops, args.contacts,
+                                              args.real_estate,
+                                              args.seed + 1))
+        for number, profile in enumerate(new_profiles):
+            profile['name'] = f"new profile {number}"
+        timed(results, "add", ops,
+              lambda: [repository.add(profile) for profile in new_profiles])
+
+        def save():
+            for name in rng.sample(names, ops):
+                profile = repository.get(name)
+                profile.setdefault('contacts', []).append(contact(rng))
+                repository.save(profile)
+        timed(results, "save", ops, save)
+
+        deleted = rng.sample(names, ops)
+        timed(results, "delete", ops,
+              lambda: [repository.delete(name) for name in deleted])
+        timed(results, "close", 1, store.close)
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def load_peak(backend, size, args):
+    """Return the peak traced memory, in bytes, of loading size profiles."""
+    directory = tempfile.mkdtemp(prefix="profile_bench_")
+    try:
+        prepare(backend, directory, size, args)
+        store = open_backend(backend, directory)
+        tracemalloc.start()
+        repository = ProfileRepository(store, ProfileSearchIndex())
+        repository.load()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del repository
+        store.close()
+        return peak
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_pdf(size, args):
+    """
+    Time exporting min(size, ops) profiles into one PDF through a
+    PdfExportService with a single worker process, including the time to
+    send them to the worker.
+    """
+    import profile_pdf
+    count = min(size, args.ops)
+    profiles = list(generate_profiles(count, args.contacts,
+                                      args.real_estate, args.seed))
+    directory = tempfile.mkdtemp(prefix="profile_bench_")
+    try:
+        filename = os.path.join(directory, "profiles.pdf")
+        service = profile_pdf.PdfExportService(workers=1)
+        start = time.perf_counter()
+        job = service.export_combined(profiles, filename)
+        while not job.done():
+            time.sleep(0.01)
+        job.result()
+        seconds = time.perf_counter() - start
+        service.close()
+        return [("pdf", count, seconds)]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def report(backend, size, results, peak=None):
+    for name, count, seconds in results:
+        rate = count / seconds if seconds else float("inf")
+        print("{:<9} {:>7} {:<7} {:>7} {:9.3f} s {:12.0f}/s".format(
+            backend, size, name, count, seconds, rate))
+    if peak is not None:
+        print("{:<9} {:>7} {:<7} {:>7} {:9.1f} MB peak".format(
+            backend, size, "memory", size, peak / 2**20))
+
+
+def run(args):
+    print("{:<9} {:>7} {:<7} {:>7} {:>11} {:>14}".format(
+        "backend", "size", "op", "count", "time", "throughput"))
+    for size in args.sizes:
+        for backend in args.backends:
+            results = bench_backend(backend, size, args)
+            peak = None if args.no_memory else load_peak(backend, size, args)
+            report(backend, size, results, peak)
+        if not args.no_pdf:
+            report("reportlab", size, bench_pdf(size, args))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the profile manager's data layer.")
+    subparsers = parser.add_subparsers(dest="command")
+    generate = subparsers.add_parser("generate",
+                                     help="write synthetic profiles")
+    generate.add_argument("path", help=".json, .jsonl or .db file")
+    generate.add_argument("--profiles", type=int, default=1000)
+    for subparser in (generate, subparsers.add_parser(
+            "run", help="time the data layer")):
+        subparser.add_argument("--contacts", type=int, default=3,
+                               help="records per contact category")
+        subparser.add_argument("--real-estate", type=int, default=1)
+        subparser.add_argument("--seed", type=int, default=0)
+    bench = subparsers.choices["run"]
+    bench.add_argument("--sizes", type=int, nargs="+",
+                       default=[1000, 10000])
+    bench.add_argument("--backends", nargs="+", choices=BACKENDS,
+                       default=list(BACKENDS))
+    bench.add_argument("--ops", type=int, default=500,
+                       help="profiles added, saved and deleted per run")
+    bench.add_argument("--no-memory", action="store_true",
+                       help="skip the traced load measuring peak memory")
+    bench.add_argument("--no-pdf", action="store_true")
+    args = parser.parse_args()
+    if args.command == "generate":
+        profiles = generate_profiles(args.profiles, args.contacts,
+                                     args.real_estate, args.seed)
+        if args.path.endswith(".db"):
+            store = SQLiteProfileStore(args.path)
+            count = store.import_profiles(profiles)
+            store.close()
+        else:
+            count = save_to_json(profiles, args.path)
+        print(f"{count} profiles written to {args.path}")
+    elif args.command == "run":
+        run(args)
+    else:
+        parser.error("a command is required")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+PDF export for the profile manager.
+
+The drawing code lives here rather than in importos.py so worker processes
+can import it without opening the profile store or a window.  Text is
+wrapped to the page by wrap_text, which measures each glyph of a font once.
+PdfExportService runs exports in a pool of worker processes, since reportlab
+spends its time in Python code and would otherwise freeze the Tk main loop.
+An export is either one PDF holding every profile, a page or more each, or
+one PDF per profile written into a directory.
+"""
+
+import os
+import re
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from profile_records import to_json
+
+
+MARGIN_X = 50  # Left and right margin
+MARGIN_Y = 50  # Top and bottom margin
+LINE_HEIGHT = 15
+
+# Profiles given to a worker at a time when writing one file per profile.
+BATCH_SIZE = 25
+
+
+# Glyph widths in points, per (font name, font size), measured once each.
+glyph_widths = {}
+
+
+def wrap_text(text, max_width, font_name, font_size):
+    """
+    Split text into lines no wider than max_width, in one pass over it.
+    Lines break at the last space that fits, or mid-word if a word is too
+    long for a line, and the spaces at a break are dropped.  Newlines in
+    text always start a new line.
+    """
+    if not text:
+        return []
+    widths = glyph_widths.setdefault((font_name, font_size), {})
+    lines = []
+    for paragraph in text.split("\n"):
+        start = 0  # Start of the current line
+        width = 0.0  # Width of paragraph[start:i]
+        space = None  # Last space in the line that could end it
+        width_to_space = 0.0  # Width of paragraph[start:space + 1]
+        wrapped = False
+        for i, char in enumerate(paragraph):
+            if wrapped and i == start and char == " ":
+                start += 1
+                continue
+            char_width = widths.get(char)
+            if char_width is None:
+                char_width = widths[char] = stringWidth(char, font_name,
+                                                        font_size)
+            while width + char_width > max_width and i > start:
+                if space is not None:
+                    lines.append(paragraph[start:space].rstrip())
+                    start = space + 1
+                    width -= width_to_space
+                else:
+                    lines.append(paragraph[start:i])
+                    start, width = i, 0.0
+                space = None
+                wrapped = True
+            if char == " " and paragraph[start:i].strip():
+                space = i
+                width_to_space = width + char_width
+            width += char_width
+        if start < len(paragraph) or not wrapped:
+            lines.append(paragraph[start:])
+    return lines
+
+
+class Page(object):
+    """Where the next line goes on a canvas, starting new pages as needed."""
+    def __init__(self, c, left=MARGIN_X, top=None):
+        self.c = c
+        self.width, self.height = letter
+        self.left = left
+        self.top = self.height - MARGIN_Y if top is None else top
+        self.max_width = self.width - left - MARGIN_X
+        self.y = self.top
+
+    def skip(self, amount):
+        self.y -= amount
+
+    def draw_wrapped_text(self, text, line_height=LINE_HEIGHT):
+        """Draw text, wrapped to fit within the margins."""
+        for line in wrap_text(text, self.max_width, self.c._fontname,
+                              self.c._fontsize):
+            if self.y < MARGIN_Y:  # Out of space on this page
+                self.c.showPage()
+                self.y = self.top
+            self.c.drawString(self.left, self.y, line)
+            self.y -= line_height
+
+
+def draw_contacts(page, title, contacts):
+    if contacts:
+        page.skip(20)
+        page.draw_wrapped_text(f"{title}:")
+        for contact in contacts:
+            # Separate name, phone, and email on different lines
+            page.skip(10)
+            page.draw_wrapped_text(f"Name: {contact['name']}")
+            page.skip(5)
+            page.draw_wrapped_text(f"Phone: {contact.get('phone', 'N/A')}")
+            page.skip(5)
+            page.draw_wrapped_text(f"Email: {contact.get('email', 'N/A')}")
+            page.skip(10)  # Extra spacing between different contacts
+    else:
+        page.skip(20)
+        page.draw_wrapped_text("Contacts: None")
+
+
+def draw_profile(c, profile):
+    """Draw a profile on a canvas, starting at the top of the current page."""
+    page = Page(c)
+    page.draw_wrapped_text(f"Profile Name: {profile['name']}")
+    draw_contacts(page, "Contacts", profile.get('contacts'))
+    draw_contacts(page, "Contact2s2", profile.get('contact2s2'))
+    draw_contacts(page, "Contact3s3", profile.get('contact3s3'))
+    for key, label in (('vehicles', "Vehicles"), ('housing', "Housing"),
+                       ('housing2', "Housing2")):
+        page.skip(20)
+        page.draw_wrapped_text(f"{label}: Yes" if profile.get(key)
+                               else f"{label}: No")
+
+
+def draw_real_estate_profile(c, profile):
+    """Draw a profile with every field and its real estate listed."""
+    page = Page(c, left=100, top=750)
+    page.draw_wrapped_text(f"Profile Information for: {profile['name']}",
+                           line_height=30)
+    for key, value in profile.items():
+        if key == 'real_estate':
+            continue  # Listed separately below
+        if isinstance(value, (list, dict)):
+            value = json.dumps(value, indent=4, default=to_json)
+        page.draw_wrapped_text(f"{key}: {value}", line_height=20)
+    page.draw_wrapped_text("real_estate:", line_height=20)
+    for real_estate in profile.get('real_estate', []):
+        page.draw_wrapped_text(f"Name: {real_estate['name']}, "
+                               f"Email: {real_estate.get('email', '')}, "
+                               f"Phone: {real_estate.get('phone', '')}",
+                               line_height=20)
+
+
+def profile_filename(profile):
+    """Return a file name for a profile's PDF that is safe on any system."""
+    name = re.sub(r"[^\w\- ]", "_", profile['name']).strip() or "profile"
+    return f"{name}_profile.pdf"
+
+
+def unique_filenames(profiles):
+    """
+    Return a file name for each profile's PDF, numbering the ones whose
+    names would clash (ignoring case, for case-insensitive file systems)
+    so that no PDF of an export overwrites another.
+    """
+    used = set()
+    filenames = []
+    for profile in profiles:
+        filename = profile_filename(profile)
+        stem = filename[:-len(".pdf")]
+        number = 1
+        while filename.lower() in used:
+            number += 1
+            filename = f"{stem} ({number}).pdf"
+        used.add(filename.lower())
+        filenames.append(filename)
+    return filenames
+
+
+def write_profile_pdf(profile, filename):
+    c = canvas.Canvas(filename, pagesize=letter)
+    draw_profile(c, profile)
+    c.save()
+
+
+def write_real_estate_pdf(profile, filename):
+    c = canvas.Canvas(filename, pagesize=letter)
+    draw_real_estate_profile(c, profile)
+    c.save()
+
+
+def write_combined(profiles, filename, progress, cancelled):
+    """
+    Write profiles into one PDF, each starting on a new page.  Runs in a
+    worker; progress is a shared counter and cancelled a shared event.
+    Returns the number of profiles written, or None if cancelled, in which
+    case nothing is written (reportlab only writes the file on save()).
+    """
+    temp_name = filename + ".tmp"
+    c = canvas.Canvas(temp_name, pagesize=letter)
+    for count, profile in enumerate(profiles):
+        if cancelled.is_set():
+            return None
+        if count:
+            c.showPage()
+        draw_profile(c, profile)
+        with progress.get_lock():
+            progress.value += 1
+    c.save()
+    os.replace(temp_name, filename)
+    return len(profiles)
+
+
+def write_each(named, directory, progress, cancelled):
+    """
+    Write one PDF per (profile, file name) pair into directory.  Runs in a
+    worker.
+    """
+    written = 0
+    for profile, filename in named:
+        if cancelled.is_set():
+            break
+        write_profile_pdf(profile, os.path.join(directory, filename))
+        written += 1
+        with progress.get_lock():
+            progress.value += 1
+    return written
+
+
+def init_worker(progress, cancelled):
+    global worker_progress, worker_cancelled
+    worker_progress = progress
+    worker_cancelled = cancelled
+
+
+def run_combined(profiles, filename):
+    return write_combined(profiles, filename, worker_progress,
+                          worker_cancelled)
+
+
+def run_each(named, directory):
+    return write_each(named, directory, worker_progress, worker_cancelled)
+
+
+class ExportJob(object):
+    """An export running in the pool; poll it from the UI."""
+    def __init__(self, service, futures, total):
+        self.service = service
+        self.futures = futures
+        self.total = total
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    def progress(self):
+        """Return the number of profiles written so far."""
+        return self.service.progress.value - self.service.progress_base
+
+    def cancel(self):
+        """Stop the export; profiles already being drawn are finished."""
+        self.service.cancelled.set()
+        for future in self.futures:
+            future.cancel()
+
+    def cancelled(self):
+        return self.service.cancelled.is_set()
+
+    def result(self):
+        """
+        Return the number of profiles exported.  Raises any error a worker
+        hit.  Call once done() is True.
+        """
+        written = 0
+        for future in self.futures:
+            if future.cancelled():
+                continue
+            count = future.result()
+            written += count or 0
+        return written
+
+
+class PdfExportService(object):
+    """
+    Runs PDF exports in worker processes, one export at a time.  The pool is
+    started on the first export and kept until close().
+    """
+    def __init__(self, workers=None):
+        self.workers = workers
+        self.executor = None
+        self.job = None
+        self.progress = multiprocessing.Value('l', 0)
+        self.cancelled = multiprocessing.Event()
+        self.progress_base = 0
+
+    def busy(self):
+        return self.job is not None and not self.job.done()
+
+    def start(self):
+        if self.busy():
+            raise RuntimeError("A PDF export is already running.")
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                self.workers, initializer=init_worker,
+                initargs=(self.progress, self.cancelled))
+        self.cancelled.clear()
+        self.progress_base = self.progress.value
+
+    def export_combined(self, profiles, filename):
+        """Export profiles into one PDF file."""
+        self.start()
+        profiles = list(profiles)
+        future = self.executor.submit(run_combined, profiles, filename)
+        self.job = ExportJob(self, [future], len(profiles))
+        return self.job
+
+    def export_each(self, profiles, directory):
+        """
+        Export each profile to its own PDF file in directory.  File names
+        are chosen here, before the profiles are split between workers, so
+        that they are unique across the whole export.
+        """
+        self.start()
+        profiles = list(profiles)
+        named = list(zip(profiles, unique_filenames(profiles)))
+        futures = [self.executor.submit(run_each,
+                                        named[i:i + BATCH_SIZE], directory)
+                   for i in range(0, len(named), BATCH_SIZE)]
+        self.job = ExportJob(self, futures, len(profiles))
+        return self.job
+
+    def close(self):
+        """Cancel any export and stop the workers."""
+        if self.job is not None:
+            self.job.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,185 @@
+"""
+Compact typed records for profiles and their contacts.
+
+Profiles are read from JSON as nested dicts, which cost several hundred
+bytes each even for a three field contact.  Profile and Contact keep the
+known keys in __slots__ instead, with anything else in an extra dict that
+only exists when needed.  They answer the dict methods the rest of the
+code uses (profile['name'], profile.get('contacts', []), setdefault,
+update, items), so they can be used wherever a profile dict was.  A
+contact category with no contacts is not stored, but indexing it still
+gives a list, as it did when profiles were saved with empty ones.
+
+from_dict() validates a dict read from storage and migrates it to the
+current form, once, as profiles are loaded.  to_json is the default hook
+for json.dump that turns records back into dicts.
+"""
+
+from categories import SCHEMA
+
+
+CATEGORIES = tuple(category.key for category in SCHEMA)
+CATEGORY_SET = frozenset(CATEGORIES)
+# Yes/no sections of a profile.  They were stored as lists at one point,
+# so any JSON value is kept as it is and read for its truth.
+FLAGS = ('vehicles', 'housing', 'housing2')
+
+
+class Record(object):
+    """Dict-like access to the slots listed in FIELDS, plus extra keys."""
+    __slots__ = ('extra',)
+    FIELDS = ()
+    FIELD_SET = frozenset()
+
+    def __init__(self):
+        self.extra = None
+
+    def __getitem__(self, key):
+        if key in self.FIELD_SET:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        if key in self.FIELD_SET:
+            return getattr(self, key) is not None
+        return self.extra is not None and key in self.extra
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+            return default
+        return self[key]
+
+    def update(self, values):
+        for key, value in values.items():
+            self[key] = value
+
+    def keys(self):
+        keys = [field for field in self.FIELDS
+                if getattr(self, field) is not None]
+        if self.extra is not None:
+            keys.extend(self.extra)
+        return keys
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def assign(self, other):
+        """Take on the contents of another record of the same type."""
+        for field in self.FIELDS:
+            setattr(self, field, getattr(other, field))
+        self.extra = other.extra
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Contact(Record):
+    """A record of a contact category: a contact or a real estate entry."""
+    __slots__ = ('name', 'phone', 'email')
+    FIELDS = __slots__
+    FIELD_SET = frozenset(FIELDS)
+
+    def __init__(self, name=None, phone=None, email=None):
+        self.name = name
+        self.phone = phone
+        self.email = email
+        self.extra = None
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, Contact):
+            return data
+        if not isinstance(data, dict):
+            raise ValueError(f"A contact must be an object, not {data!r}.")
+        contact = cls()
+        for key, value in data.items():
+            if key in cls.FIELD_SET and value is not None:
+                # Numbers typed into a phone field, for one
+                value = value if isinstance(value, str) else str(value)
+            contact[key] = value
+        return contact
+
+
+class Profile(Record):
+    """A profile: its name, yes/no sections and contact categories."""
+    __slots__ = ('name',) + FLAGS + CATEGORIES
+    FIELDS = __slots__
+    FIELD_SET = frozenset(FIELDS)
+
+    def __init__(self, name):
+        self.name = name
+        for key in FLAGS + CATEGORIES:
+            setattr(self, key, None)
+        self.extra = None
+
+    def __getitem__(self, key):
+        if key in CATEGORY_SET and getattr(self, key) is None:
+            # Made when first indexed, so that appending to it sticks
+            setattr(self, key, [])
+        return Record.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key in CATEGORY_SET:
+            # Unlike indexing, get() leaves an empty category unstored
+            value = getattr(self, key)
+            return default if value is None else value
+        return Record.get(self, key, default)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Return data as a Profile.  Raises ValueError if it has no name or a
+        category that is not a list of contacts.
+        """
+        if isinstance(data, Profile):
+            return data
+        if not isinstance(data, dict):
+            raise ValueError(f"A profile must be an object, not {data!r}.")
+        name = data.get('name')
+        if not isinstance(name, str) or not name:
+            raise ValueError(f"Profile has no name: {data!r}.")
+        profile = cls(name)
+        for key, value in data.items():
+            if key == 'name':
+                continue
+            if key in CATEGORIES and value is not None:
+                if not isinstance(value, list):
+                    raise ValueError(
+                        f"Profile '{name}' has a {key} that is not a list.")
+                try:
+                    # An empty list is left out until it is indexed
+                    value = [Contact.from_dict(record)
+                             for record in value] or None
+                except ValueError as error:
+                    raise ValueError(f"Profile '{name}': {error}")
+            profile[key] = value
+        return profile
+
+
+def to_json(value):
+    """default= hook for json.dump and json.dumps."""
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
@@ -0,0 +1,181 @@
+"""
+In-memory repository of profiles for the profile manager.
+
+The repository owns the list of profiles (in the order they are shown in
+the profiles listbox) and keeps an index from profile name to profile and
+to listbox position, so lookups never scan the list.  Every change goes
+through it, which keeps the indexes, the backing store and (if given) a
+ProfileSearchIndex in step.
+"""
+
+from profile_records import Profile
+
+
+class ProfileRepository(object):
+    """Profiles in listbox order, indexed by name, saved through a store."""
+    def __init__(self, store, search_index=None):
+        self.store = store
+        self.search_index = search_index
+        self.profiles = []
+        self.by_name = {}
+        self.positions = {}
+
+    def load(self):
+        """Load every profile from the store, replacing what is held."""
+        self.profiles = [Profile.from_dict(profile)
+                         for profile in self.store.load()]
+        self.by_name = {profile['name']: profile for profile in self.profiles}
+        self.positions = None
+        if self.search_index is not None:
+            self.search_index.rebuild(self.profiles)
+        return self.profiles
+
+    def clear(self):
+        """Forget every profile, before loading them in batches."""
+        self.profiles = []
+        self.by_name = {}
+        self.positions = None
+        if self.search_index is not None:
+            self.search_index.rebuild([])
+
+    def extend(self, profiles):
+        """
+        Add a batch of profiles read from the store, after those already
+        held.  Nothing is saved.
+        """
+        profiles = [Profile.from_dict(profile) for profile in profiles]
+        self.profiles.extend(profiles)
+        for profile in profiles:
+            self.by_name[profile['name']] = profile
+        self.positions = None
+        if self.search_index is not None:
+            self.search_index.extend(profiles)
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def __iter__(self):
+        return iter(self.profiles)
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def get(self, name):
+        """Return the profile called name, or None."""
+        return self.by_name.get(name)
+
+    def at(self, index):
+        """Return the profile at a listbox position."""
+        return self.profiles[index]
+
+    def name_at(self, index):
+        return self.profiles[index]['name']
+
+    def index_of(self, name):
+        """Return the listbox position of the profile called name."""
+        if self.positions is None:
+            self.positions = {profile['name']: i
+                              for i, profile in enumerate(self.profiles)}
+        return self.positions[name]
+
+    def add(self, profile):
+        """
+        Add and save a new profile, a Profile or a dict.  Returns its
+        listbox position.
+        """
+        profile = Profile.from_dict(profile)
+        name = profile['name']
+        if name in self.by_name:
+            raise ValueError(f"Profile '{name}' already exists.")
+        self.profiles.append(profile)
+        self.by_name[name] = profile
+        if self.positions is not None:
+            self.positions[name] = len(self.profiles) - 1
+        self.store.put(profile)
+        if self.search_index is not None:
+            self.search_index.update(profile)
+        return len(self.profiles) - 1
+
+    def delete(self, name):
+        """Delete a profile.  Returns the listbox position it had."""
+        index = self.drop(name)
+        self.store.delete(name)
+        return index
+
+    def drop(self, name):
+        """Forget a profile without saving.  Returns its listbox position."""
+        index = self.index_of(name)
+        self.profiles.pop(index)
+        del self.by_name[name]
+        # Every later profile moved up one; rebuild the positions lazily.
+        self.positions = None
+        if self.search_index is not None:
+            self.search_index.remove(name)
+        return index
+
+    def rename(self, name, new_name):
+        if new_name in self.by_name:
+            raise ValueError(f"Profile '{new_name}' already exists.")
+        self.rename_held(name, new_name)
+        self.store.rename(name, new_name)
+
+    def rename_held(self, name, new_name):
+        profile = self.by_name.pop(name)
+        profile['name'] = new_name
+        self.by_name[new_name] = profile
+        if self.positions is not None:
+            self.positions[new_name] = self.positions.pop(name)
+        if self.search_index is not None:
+            self.search_index.rename(name, profile)
+
+    def apply_records(self, records):
+        """
+        Apply journal records written by another instance of the app to
+        what is held, without saving them.  A profile that is replaced
+        keeps its identity, so windows showing it stay valid.  Returns the
+        names of the profiles changed.
+        """
+        changed = set()
+        for record in records:
+            op = record['op']
+            if op == 'put':
+                profile = Profile.from_dict(record['profile'])
+                name = profile['name']
+                held = self.by_name.get(name)
+                if held is None:
+                    self.profiles.append(profile)
+                    self.by_name[name] = profile
+                    if self.positions is not None:
+                        self.positions[name] = len(self.profiles) - 1
+                else:
+                    held.assign(profile)
+                    profile = held
+                if self.search_index is not None:
+                    self.search_index.update(profile)
+                changed.add(name)
+            elif op == 'delete':
+                if record['name'] in self.by_name:
+                    self.drop(record['name'])
+                    changed.add(record['name'])
+            elif op == 'rename':
+                name, new_name = record['name'], record['new_name']
+                if name in self.by_name and new_name not in self.by_name:
+                    self.rename_held(name, new_name)
+                    changed.update((name, new_name))
+        return changed
+
+    def save(self, profile):
+        """Save changes made to the contents of a profile."""
+        self.store.put(profile)
+        if self.search_index is not None:
+            self.search_index.update(profile)
+
+    def search(self, query):
+        """
+        Return the names of the profiles matching query, in listbox order,
+        or None if the query is empty.  Needs a search index.
+        """
+        names = self.search_index.search(query)
+        if names is None:
+            return None
+        return sorted(names, key=self.index_of)
@@ -0,0 +1,161 @@
+"""
+Prefix search over profile names and the names, phone numbers and email
+addresses of every contact in every category.
+
+ProfileSearchIndex keeps an inverted index from each token to the names
+of the profiles containing it, plus a sorted list of the tokens so that
+all tokens starting with a prefix are found with two binary searches.  It
+is updated one profile at a time as profiles are saved.
+"""
+
+import re
+import bisect
+
+from profile_store import CATEGORIES
+
+
+WORD = re.compile(r"[a-z0-9]+")
+PHONE = re.compile(r"[\d\s\-().+]+")
+
+
+def profile_tokens(profile):
+    """Return the set of tokens a profile can be found by."""
+    tokens = set(WORD.findall(profile['name'].lower()))
+    for category in CATEGORIES:
+        for contact in profile.get(category, []):
+            tokens.update(WORD.findall((contact.get('name') or '').lower()))
+            phone = re.sub(r"\D", "", contact.get('phone') or '')
+            if phone:
+                tokens.add(phone)
+            email = (contact.get('email') or '').lower()
+            if email:
+                tokens.add(email)
+                tokens.update(WORD.findall(email))
+    return tokens
+
+
+def query_terms(query):
+    """Split a search query into the prefixes every result must match."""
+    terms = []
+    for term in query.lower().split():
+        if '@' in term:
+            terms.append(term)
+        elif PHONE.fullmatch(term) and any(c.isdigit() for c in term):
+            terms.append(re.sub(r"\D", "", term))
+        else:
+            terms.extend(WORD.findall(term))
+    return terms
+
+
+class ProfileSearchIndex(object):
+    """An inverted prefix index from tokens to profile names."""
+    def __init__(self):
+        self.postings = {}
+        self.tokens = []
+        # Tokens of each profile, as tuples, which take a fraction of the
+        # memory of sets
+        self.by_profile = {}
+        # Matches for one letter prefixes, which are slow to gather and
+        # the first thing typed in every search.
+        self.short_matches = {}
+
+    def rebuild(self, profiles):
+        self.postings = {}
+        self.by_profile = {}
+        self.short_matches = {}
+        for profile in profiles:
+            tokens = profile_tokens(profile)
+            self.by_profile[profile['name']] = tuple(tokens)
+            for token in tokens:
+                self.postings.setdefault(token, set()).add(profile['name'])
+        self.tokens = sorted(self.postings)
+
+    def extend(self, profiles):
+        """Index a batch of new profiles."""
+        added = False
+        for profile in profiles:
+            tokens = profile_tokens(profile)
+            self.by_profile[profile['name']] = tuple(tokens)
+            for token in tokens:
+                names = self.postings.get(token)
+                if names is None:
+                    names = self.postings[token] = set()
+                    self.tokens.append(token)
+                    added = True
+                names.add(profile['name'])
+        if added:
+            # Sorting merges the new tokens into the sorted run in one pass
+            self.tokens.sort()
+        self.short_matches = {}
+
+    def update(self, profile):
+        """Index a new profile, or re-index one whose contents changed."""
+        name = profile['name']
+        old_tokens = set(self.by_profile.get(name, ()))
+        new_tokens = profile_tokens(profile)
+        for token in old_tokens - new_tokens:
+            self.remove_posting(token, name)
+        for token in new_tokens - old_tokens:
+            self.short_matches.pop(token[:1], None)
+            if token not in self.postings:
+                self.postings[token] = set()
+                bisect.insort(self.tokens, token)
+            self.postings[token].add(name)
+        self.by_profile[name] = tuple(new_tokens)
+
+    def remove(self, name):
+        for token in self.by_profile.pop(name, ()):
+            self.remove_posting(token, name)
+
+    def rename(self, name, profile):
+        """The profile now called profile['name'] used to be called name."""
+        self.remove(name)
+        self.update(profile)
+
+    def remove_posting(self, token, name):
+        self.short_matches.pop(token[:1], None)
+        names = self.postings[token]
+        names.discard(name)
+        if not names:
+            del self.postings[token]
+            del self.tokens[bisect.bisect_left(self.tokens, token)]
+
+    def prefix_range(self, prefix):
+        start = bisect.bisect_left(self.tokens, prefix)
+        end = bisect.bisect_left(self.tokens, prefix + "\uffff", start)
+        return start, end
+
+    def prefix_matches(self, prefix):
+        """Return the set of names with a token starting with prefix."""
+        if len(prefix) == 1 and prefix in self.short_matches:
+            return set(self.short_matches[prefix])
+        start, end = self.prefix_range(prefix)
+        matches = set()
+        for token in self.tokens[start:end]:
+            matches.update(self.postings[token])
+        if len(prefix) == 1:
+            self.short_matches[prefix] = frozenset(matches)
+        return matches
+
+    def search(self, query):
+        """
+        Return the set of names of profiles matching every term of the
+        query by prefix, or None if the query has no terms.  Terms are
+        intersected starting with the one matching the fewest tokens.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return None
+        def token_count(term):
+            start, end = self.prefix_range(term)
+            return end - start
+        terms.sort(key=token_count)
+        matches = None
+        for term in terms:
+            if matches is None:
+                matches = self.prefix_matches(term)
+            else:
+                matches &= self.prefix_matches(term)
+            if not matches:
+                break
+        return matches
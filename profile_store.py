@@ -0,0 +1,1005 @@
+"""
+Storage for the profile manager.
+
+Profiles live in a JSON snapshot (profiles.json).  Each change is appended
+to a journal file next to it as one small JSON record, so saving costs
+about the size of the change rather than of the whole file.  Once the
+journal grows long it is sealed and folded into a new snapshot on a
+background thread.  Snapshots are written to a temporary file and renamed
+over the old one, so a crash leaves either the old or the new snapshot,
+never a truncated one.
+
+Journal records are one of:
+    {"op": "put", "profile": {...}}          add or replace by name
+    {"op": "delete", "name": "..."}
+    {"op": "rename", "name": "...", "new_name": "..."}
+Replaying a record twice gives the same result, which lets a compaction
+interrupted by a crash simply be redone.  Each journal also starts with a
+{"op": "generation", "number": N} record counting the journals so far.
+
+SQLiteProfileStore offers the same interface on top of an SQLite database,
+with a table for profiles and one for each contact category, and a log of
+which profiles each instance changed so the others can follow them.
+
+Profile files can also be read and written one profile at a time, in JSON
+or JSON Lines (one profile per line) form, for files too large to hold in
+memory; run this module to copy profiles between the formats.
+"""
+
+import os
+import copy
+import json
+import time
+import uuid
+import argparse
+import sqlite3
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Not on Windows; instances there are not kept apart
+
+from categories import SCHEMA
+from profile_records import Profile, Contact, to_json
+
+
+JOURNAL_SUFFIX = ".journal"
+SEALED_SUFFIX = ".journal.old"
+LOCK_SUFFIX = ".lock"
+# How the first line of a journal, its generation record, begins.
+GENERATION_PREFIX = b'{"op":"generation"'
+COMPACT_AFTER = 500
+
+# Profile files with this suffix hold one JSON profile per line.
+JSONL_SUFFIX = ".jsonl"
+READ_BLOCK = 1 << 16
+PROGRESS_EVERY = 1000
+
+# AutosaveStore waits this long after the last change before saving, but
+# never more than AUTOSAVE_MAX_DELAY after the first unsaved one.
+AUTOSAVE_DELAY = 1.0
+AUTOSAVE_MAX_DELAY = 5.0
+# Seconds between looks for changes made by other instances.
+AUTOSAVE_POLL = 2.0
+# Entries kept in the SQLite change log; an instance further behind than
+# this reloads everything.
+CHANGE_LOG_SIZE = 10000
+
+# Lists of contacts kept in each profile, and the fields of a contact.
+CATEGORIES = tuple(category.key for category in SCHEMA)
+CONTACT_FIELDS = ('name', 'phone', 'email')
+
+
+def save_to_json(profiles, filename, progress=None):
+    """
+    Write profiles to filename atomically (temporary file + rename).  A
+    filename ending in .jsonl gets one profile per line, anything else a
+    JSON array.  profiles may be any iterable, e.g. a generator reading
+    another file; it is written one profile at a time, so only one profile
+    needs to be in memory.  progress(count) is called every
+    PROGRESS_EVERY profiles.
+    """
+    temp_name = filename + ".tmp"
+    lines = filename.endswith(JSONL_SUFFIX)
+    count = 0
+    with open(temp_name, "w", encoding="utf-8") as file:
+        if not lines:
+            file.write("[")
+        for profile in profiles:
+            if lines:
+                file.write(json.dumps(profile, separators=(",", ":"),
+                                      default=to_json))
+                file.write("\n")
+            else:
+                file.write(",\n    " if count else "\n    ")
+                text = json.dumps(profile, indent=4, default=to_json)
+                file.write(text.replace("\n", "\n    "))
+            count += 1
+            if progress is not None and count % PROGRESS_EVERY == 0:
+                progress(count)
+        if not lines:
+            file.write("\n]" if count else "]")
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_name, filename)
+    return count
+
+
+def iter_profiles(filename, progress=None):
+    """
+    Yield the profiles in a JSON array or JSON Lines file one at a time,
+    reading it in blocks, so files larger than memory can be read.
+    progress(done, total) is called with the bytes read so far and the
+    size of the file after each block.
+    """
+    total = os.path.getsize(filename)
+    with open(filename, "r", encoding="utf-8") as file:
+        report = None
+        if progress is not None:
+            report = lambda: progress(file.buffer.tell(), total)
+        if filename.endswith(JSONL_SUFFIX):
+            yield from iter_lines(file, report)
+        else:
+            yield from iter_array(file, report)
+
+
+def iter_lines(file, report):
+    for number, line in enumerate(file, 1):
+        if line.strip():
+            yield json.loads(line)
+        if report is not None and number % PROGRESS_EVERY == 0:
+            report()
+    if report is not None:
+        report()
+
+
+def iter_array(file, report):
+    """Yield the items of the JSON array in file, read a block at a time."""
+    decoder = json.JSONDecoder()
+    text = ""
+    position = 0
+    at_start = True
+    while True:
+        # Skip to the next item; read another block whenever the text held
+        # runs out before the item is complete
+        while position < len(text) and text[position] in " \t\r\n,":
+            position += 1
+        if position < len(text):
+            if at_start:
+                if text[position] != "[":
+                    raise ValueError("Profile file is not a JSON array.")
+                at_start = False
+                position += 1
+                continue
+            if text[position] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(text, position)
+            except ValueError:
+                end = None
+            else:
+                if not isinstance(item, dict):
+                    raise ValueError("Profile file holds a non-profile.")
+        if position >= len(text) or end is None:
+            block = file.read(READ_BLOCK)
+            if not block:
+                if position < len(text):
+                    # Decoding fails again, reporting where
+                    decoder.raw_decode(text, position)
+                raise ValueError("Profile file ends before its array does.")
+            text = text[position:] + block
+            position = 0
+            if report is not None:
+                report()
+            continue
+        position = end
+        yield item
+
+
+def load_snapshot(filename):
+    if os.path.exists(filename):
+        return list(iter_profiles(filename))
+    return []
+
+
+def replay_journal(profiles, filename):
+    """
+    Apply the records of a journal file to a list of profiles in place.
+    Returns the byte offset of the end of the last complete record; a
+    partial record left by a crash mid-write, and anything after it, is
+    ignored.
+    """
+    if not os.path.exists(filename):
+        return 0
+    positions = {profile['name']: i for i, profile in enumerate(profiles)}
+    good_offset = 0
+    with open(filename, "rb") as journal:
+        for line in journal:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line.decode("utf-8"))
+            except ValueError:
+                break
+            apply_record(profiles, positions, record)
+            good_offset += len(line)
+    profiles[:] = [profile for profile in profiles if profile is not None]
+    return good_offset
+
+
+def apply_record(profiles, positions, record):
+    """
+    Apply one journal record.  Deleted profiles are left as None so the
+    positions of the others stay valid until replay_journal removes them.
+    """
+    op = record['op']
+    if op == 'put':
+        profile = record['profile']
+        index = positions.get(profile['name'])
+        if index is None:
+            positions[profile['name']] = len(profiles)
+            profiles.append(profile)
+        else:
+            profiles[index] = profile
+    elif op == 'delete':
+        index = positions.pop(record['name'], None)
+        if index is not None:
+            profiles[index] = None
+    elif op == 'rename':
+        index = positions.pop(record['name'], None)
+        if index is not None:
+            profiles[index]['name'] = record['new_name']
+            positions[record['new_name']] = index
+    elif op != 'generation':
+        raise ValueError(f"Unknown journal record '{op}'.")
+
+
+class FileLock(object):
+    """
+    A lock shared by the threads of this process and, where fcntl exists,
+    with other processes locking the same file.  It can be taken again by
+    the thread holding it.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if self.depth == 0 and fcntl is not None:
+            if self.file is None:
+                self.file = open(self.filename, "a")
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self.depth -= 1
+        if self.depth == 0 and fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.thread_lock.release()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class JournaledProfileStore(object):
+    """
+    Saves profile changes to a journal and compacts it into a snapshot.
+
+    Several instances of the app may share the files.  Every write happens
+    under a lock file, after reading the records the other instances have
+    appended since this one last looked, which sync() and apply() return so
+    they can be merged into what is shown.  Each journal starts with its
+    generation number, so an instance can tell when the journal it was
+    reading has been sealed by another one and carry on in the next.
+    """
+    def __init__(self, filename, compact_after=COMPACT_AFTER):
+        self.filename = filename
+        self.journal_name = filename + JOURNAL_SUFFIX
+        self.sealed_name = filename + SEALED_SUFFIX
+        self.compact_after = compact_after
+        self.lock = FileLock(filename + LOCK_SUFFIX)
+        self.journal = None
+        self.journal_id = None
+        self.generation = 0
+        self.offset = 0  # End of the last record read from the journal
+        self.records = 0
+        self.compactor = None
+
+    def load(self):
+        """
+        Return the saved profiles, the snapshot with the journal applied, as
+        Profile records.  Raises ValueError if one is not a valid profile.
+        """
+        with self.lock:
+            if os.path.exists(self.sealed_name):
+                # A compaction was interrupted; finish it before going on.
+                self.compact_sealed()
+            profiles = []
+            if os.path.exists(self.filename):
+                # Converted as they are read, so the dicts never all exist
+                # at once
+                profiles = [Profile.from_dict(profile)
+                            for profile in iter_profiles(self.filename)]
+            good_offset = replay_journal(profiles, self.journal_name)
+            if self.journal is not None:
+                self.journal.close()  # Loading again, after reload
+            if os.path.exists(self.journal_name):
+                with open(self.journal_name, "rb+") as journal:
+                    journal.truncate(good_offset)
+            self.open_journal()
+            self.offset = good_offset
+            self.journal.seek(0)
+            self.records = sum(1 for line in self.journal
+                               if not line.startswith(GENERATION_PREFIX))
+        # Profiles put by the journal are still dicts
+        return [Profile.from_dict(profile) for profile in profiles]
+
+    def open_journal(self):
+        """
+        Open the journal, starting it with a generation record if it is new.
+        Returns the offset just past that record.
+        """
+        self.journal = open(self.journal_name, "a+b")
+        self.journal_id = journal_id(os.fstat(self.journal.fileno()))
+        self.journal.seek(0)
+        first = self.journal.readline()
+        if not first:
+            first = encode_record({'op': 'generation',
+                                   'number': self.generation})
+            self.journal.write(first)
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            return len(first)
+        if first.startswith(GENERATION_PREFIX):
+            self.generation = json.loads(first.decode("utf-8"))['number']
+            return len(first)
+        # A journal from before generations were recorded
+        self.generation = 0
+        return 0
+
+    def put(self, profile):
+        """Save a new profile, or all of the changes to an existing one."""
+        return self.append({'op': 'put', 'profile': profile})
+
+    def delete(self, name):
+        return self.append({'op': 'delete', 'name': name})
+
+    def rename(self, name, new_name):
+        return self.append({'op': 'rename', 'name': name,
+                            'new_name': new_name})
+
+    def append(self, record):
+        return self.apply([record])
+
+    def apply(self, records):
+        """
+        Append journal records, syncing the journal once for them all.
+        Returns the records other instances wrote since the last sync().
+        """
+        data = b"".join(encode_record(record) for record in records)
+        with self.lock:
+            changes = self.read_changes()
+            self.journal.write(data)
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.offset = self.journal.tell()
+            self.records += len(records)
+            if (self.records >= self.compact_after and
+                    not self.compacting() and
+                    not os.path.exists(self.sealed_name)):
+                self.seal()
+                self.compactor = threading.Thread(target=self.compact_sealed)
+                self.compactor.start()
+        return changes
+
+    def sync(self):
+        """Return the records other instances wrote since the last sync()."""
+        if self.unchanged():
+            return []
+        with self.lock:
+            return self.read_changes()
+
+    def unchanged(self):
+        """
+        A cheap check, without the lock, that no other instance has written:
+        the journal is still ours and no longer than what has been read.
+        """
+        try:
+            stat = os.stat(self.journal_name)
+        except FileNotFoundError:
+            return False
+        return journal_id(stat) == self.journal_id and stat.st_size == \
+            self.offset
+
+    def read_changes(self):
+        """
+        Read the records appended since offset.  If the journal was sealed
+        by another instance, the rest of it is read through the file still
+        open and reading carries on in the new one.  If more than one
+        generation went by, the records in between are only in the
+        snapshot, and a single {'op': 'reload'} record is returned instead.
+        """
+        changes = self.read_journal()
+        if journal_id(os.stat(self.journal_name)) == self.journal_id:
+            return changes
+        expected = self.generation + 1
+        self.journal.close()
+        self.offset = self.open_journal()
+        if self.generation != expected:
+            self.offset = self.journal.seek(0, os.SEEK_END)
+            self.records = 0
+            return [{'op': 'reload'}]
+        self.records = 0
+        return changes + self.read_journal()
+
+    def read_journal(self):
+        """Read the records after offset.  Call with the lock held."""
+        self.journal.seek(self.offset)
+        records = []
+        for line in self.journal:
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("Partial record")
+                record = json.loads(line.decode("utf-8"))
+            except ValueError:
+                # Left by an instance that crashed while writing it; cut it
+                # off so the next record starts on a line of its own
+                self.journal.truncate(self.offset)
+                break
+            self.offset += len(line)
+            if record['op'] != 'generation':
+                records.append(record)
+        self.records += len(records)
+        return records
+
+    def compacting(self):
+        return self.compactor is not None and self.compactor.is_alive()
+
+    def seal(self):
+        """Start a new journal; the old one is kept for compact_sealed()."""
+        self.journal.close()
+        os.replace(self.journal_name, self.sealed_name)
+        self.generation += 1
+        self.offset = self.open_journal()
+        self.records = 0
+
+    def compact_sealed(self):
+        """Fold the sealed journal into a new snapshot, then remove it."""
+        with self.lock:
+            if not os.path.exists(self.sealed_name):
+                return  # Another instance got there first
+            profiles = load_snapshot(self.filename)
+            replay_journal(profiles, self.sealed_name)
+            save_to_json(profiles, self.filename)
+            os.remove(self.sealed_name)
+
+    def close(self):
+        """Wait for any compaction, then fold the journal into the snapshot."""
+        if self.compactor is not None:
+            self.compactor.join()
+        with self.lock:
+            self.read_changes()
+            if self.records and not os.path.exists(self.sealed_name):
+                self.seal()
+                self.compact_sealed()
+            self.journal.close()
+        self.lock.close()
+
+
+def journal_id(stat):
+    """What identifies a journal file across renames."""
+    return stat.st_dev, stat.st_ino
+
+
+def encode_record(record):
+    return (json.dumps(record, separators=(",", ":"), default=to_json) +
+            "\n").encode("utf-8")
+
+
+class SQLiteProfileStore(object):
+    """
+    Stores profiles in SQLite.  Each profile is a row of the profiles table
+    (its keys other than the name and contact lists are kept as JSON), and
+    each contact category is a table of its own with indexed name, phone and
+    email columns.  Every save is a single transaction touching only the
+    rows of that profile.
+
+    Each change also adds a row to the changes table, naming the instance
+    that made it, the kind of change, the profile's id and the name it had
+    before, so that sync() can tell the other instances which profiles to
+    update.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.lock = threading.Lock()
+        self.writer = uuid.uuid4().hex
+        self.data_version = None
+        self.seen = None  # Last change log entry read, once loaded
+        with self.connection:
+            self.create_tables()
+
+    def create_tables(self):
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            "id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, "
+            "extra TEXT NOT NULL DEFAULT '{}')")
+        for category in CATEGORIES:
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {category} ("
+                "profile_id INTEGER NOT NULL "
+                "REFERENCES profiles(id) ON DELETE CASCADE, "
+                "position INTEGER NOT NULL, "
+                "name TEXT, phone TEXT, email TEXT, "
+                "PRIMARY KEY (profile_id, position))")
+            for field in CONTACT_FIELDS:
+                self.connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {category}_{field} "
+                    f"ON {category} ({field})")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS changes ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, writer TEXT NOT NULL, "
+            "op TEXT NOT NULL, profile_id INTEGER NOT NULL, "
+            "name TEXT NOT NULL)")
+
+    def is_empty(self):
+        query = "SELECT NOT EXISTS (SELECT 1 FROM profiles)"
+        return bool(self.connection.execute(query).fetchone()[0])
+
+    def load(self):
+        """Return every profile, in the order they were added."""
+        with self.lock:
+            # Changes are looked for from here on
+            self.data_version = self.connection.execute(
+                "PRAGMA data_version").fetchone()[0]
+            self.seen = self.connection.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM changes").fetchone()[0]
+        profiles = []
+        by_id = {}
+        for profile_id, name, extra in self.connection.execute(
+                "SELECT id, name, extra FROM profiles ORDER BY id"):
+            profile = self.new_profile(name, extra)
+            by_id[profile_id] = profile
+            profiles.append(profile)
+        for category in CATEGORIES:
+            for row in self.connection.execute(
+                    f"SELECT profile_id, name, phone, email FROM {category} "
+                    "ORDER BY profile_id, position"):
+                by_id[row[0]].setdefault(category, []).append(
+                    Contact(*row[1:]))
+        return profiles
+
+    def new_profile(self, name, extra):
+        """A Profile with no contacts, from a row of the profiles table."""
+        data = json.loads(extra)
+        data['name'] = name
+        return Profile.from_dict(data)
+
+    def names(self):
+        """Return the profile names in order, without loading the profiles."""
+        query = "SELECT name FROM profiles ORDER BY id"
+        return [row[0] for row in self.connection.execute(query)]
+
+    def fetch(self, name):
+        """Return the profile called name, or None."""
+        row = self.connection.execute(
+            "SELECT id, name, extra FROM profiles WHERE name = ?",
+            (name,)).fetchone()
+        return self.build(*row) if row else None
+
+    def build(self, profile_id, name, extra):
+        profile = self.new_profile(name, extra)
+        for category in CATEGORIES:
+            records = [Contact(*row) for row in self.connection.execute(
+                f"SELECT name, phone, email FROM {category} "
+                "WHERE profile_id = ? ORDER BY position", (profile_id,))]
+            if records:
+                profile[category] = records
+        return profile
+
+    def put(self, profile):
+        """Save a new profile, or all of the changes to an existing one."""
+        with self.lock, self.connection:
+            self.put_unlocked(profile)
+            self.prune()
+
+    def put_unlocked(self, profile):
+        """put() for callers already holding the lock and a transaction."""
+        extra = {key: value for key, value in profile.items()
+                 if key != 'name' and key not in CATEGORIES}
+        self.write(profile, json.dumps(extra))
+
+    def write(self, profile, extra):
+        row = self.connection.execute(
+            "SELECT id FROM profiles WHERE name = ?",
+            (profile['name'],)).fetchone()
+        if row:
+            profile_id = row[0]
+            self.connection.execute(
+                "UPDATE profiles SET extra = ? WHERE id = ?",
+                (extra, profile_id))
+        else:
+            profile_id = self.connection.execute(
+                "INSERT INTO profiles (name, extra) VALUES (?, ?)",
+                (profile['name'], extra)).lastrowid
+        self.log('put', profile_id, profile['name'])
+        for category in CATEGORIES:
+            self.connection.execute(
+                f"DELETE FROM {category} WHERE profile_id = ?", (profile_id,))
+            rows = [(profile_id, position, contact.get('name'),
+                     contact.get('phone'), contact.get('email'))
+                    for position, contact
+                    in enumerate(profile.get(category, []))]
+            self.connection.executemany(
+                f"INSERT INTO {category} VALUES (?, ?, ?, ?, ?)", rows)
+
+    def delete(self, name):
+        self.apply([{'op': 'delete', 'name': name}])
+
+    def rename(self, name, new_name):
+        self.apply([{'op': 'rename', 'name': name, 'new_name': new_name}])
+
+    def log(self, op, profile_id, name):
+        """Note in the change log that a profile called name is changing."""
+        self.connection.execute(
+            "INSERT INTO changes (writer, op, profile_id, name) "
+            "VALUES (?, ?, ?, ?)", (self.writer, op, profile_id, name))
+
+    def prune(self):
+        """Drop all but the last CHANGE_LOG_SIZE entries of the change log."""
+        self.connection.execute(
+            "DELETE FROM changes WHERE id <= "
+            "(SELECT MAX(id) FROM changes) - ?", (CHANGE_LOG_SIZE,))
+
+    def sync(self):
+        """
+        Return journal style records of the changes other connections have
+        made since the last call: deletes of the profiles gone, renames of
+        those whose name changed, then puts of every changed profile as it
+        is now.  A profile renamed to a name another changed profile had is
+        deleted and put under its new name instead, since renaming onto a
+        name still held does nothing.  If the entries since the last call
+        have been pruned from the change log, [{'op': 'reload'}] is
+        returned.
+        """
+        with self.lock:
+            if self.seen is None:
+                return []  # Not loaded yet
+            version = self.connection.execute(
+                "PRAGMA data_version").fetchone()[0]
+            if version == self.data_version:
+                return []
+            self.data_version = version
+            oldest = self.connection.execute(
+                "SELECT MIN(id) FROM changes").fetchone()[0]
+            if oldest is not None and oldest > self.seen + 1:
+                self.seen = self.connection.execute(
+                    "SELECT MAX(id) FROM changes").fetchone()[0]
+                return [{'op': 'reload'}]
+            # The name each profile changed had before the first change.
+            # SQLite can give a deleted profile's id to a new one, so
+            # profiles are told apart by id and the deletes of it seen.
+            before = {}
+            deletes_seen = {}
+            for change_id, writer, op, profile_id, name in \
+                    self.connection.execute(
+                        "SELECT id, writer, op, profile_id, name FROM changes "
+                        "WHERE id > ? ORDER BY id", (self.seen,)):
+                self.seen = change_id
+                key = (profile_id, deletes_seen.get(profile_id, 0))
+                if writer != self.writer:
+                    before.setdefault(key, name)
+                if op == 'delete':
+                    deletes_seen[profile_id] = key[1] + 1
+            old_names = set(before.values())
+            deletes = []
+            renames = []
+            puts = []
+            for (profile_id, deleted), name in before.items():
+                row = None
+                if deleted == deletes_seen.get(profile_id, 0):
+                    row = self.connection.execute(
+                        "SELECT id, name, extra FROM profiles WHERE id = ?",
+                        (profile_id,)).fetchone()
+                if row is None or (row[1] != name and row[1] in old_names):
+                    deletes.append({'op': 'delete', 'name': name})
+                elif row[1] != name:
+                    renames.append({'op': 'rename', 'name': name,
+                                    'new_name': row[1]})
+                if row is not None:
+                    puts.append({'op': 'put', 'profile': self.build(*row)})
+            return deletes + renames + puts
+
+    def apply(self, records):
+        """
+        Apply journal style records in a single transaction.  Returns what
+        sync() would have before it.
+        """
+        changes = self.sync()
+        with self.lock, self.connection:
+            for record in records:
+                op = record['op']
+                if op == 'put':
+                    self.put_unlocked(record['profile'])
+                    continue
+                if op not in ('delete', 'rename'):
+                    raise ValueError(f"Unknown journal record '{op}'.")
+                row = self.connection.execute(
+                    "SELECT id FROM profiles WHERE name = ?",
+                    (record['name'],)).fetchone()
+                if row is None:
+                    continue
+                self.log(op, row[0], record['name'])
+                if op == 'delete':
+                    self.connection.execute(
+                        "DELETE FROM profiles WHERE id = ?", row)
+                else:
+                    self.connection.execute(
+                        "UPDATE profiles SET name = ? WHERE id = ?",
+                        (record['new_name'], row[0]))
+            self.prune()
+        return changes
+
+    def import_json(self, filename, progress=None):
+        """
+        Add or replace every profile in a JSON or JSON Lines file, reading
+        it one profile at a time.
+        """
+        return self.import_profiles(iter_profiles(filename, progress))
+
+    def import_profiles(self, profiles):
+        """Add or replace every profile from an iterable in one transaction."""
+        count = 0
+        with self.lock, self.connection:
+            for profile in profiles:
+                self.put_unlocked(profile)
+                count += 1
+            self.prune()
+        return count
+
+    def iter_profiles(self):
+        """
+        Yield every profile in order.  The profiles and each category are
+        read by one query apiece, ordered by profile, and the rows grouped
+        as they arrive, so only the profile being yielded is in memory.
+        """
+        categories = [(category, self.connection.execute(
+            f"SELECT profile_id, name, phone, email FROM {category} "
+            "ORDER BY profile_id, position")) for category in CATEGORIES]
+        next_rows = {category: next(rows, None)
+                     for category, rows in categories}
+        for profile_id, name, extra in self.connection.execute(
+                "SELECT id, name, extra FROM profiles ORDER BY id"):
+            profile = self.new_profile(name, extra)
+            for category, rows in categories:
+                row = next_rows[category]
+                records = []
+                while row is not None and row[0] <= profile_id:
+                    if row[0] == profile_id:
+                        records.append(Contact(*row[1:]))
+                    row = next(rows, None)
+                next_rows[category] = row
+                if records:
+                    profile[category] = records
+            yield profile
+
+    def export_json(self, filename, progress=None):
+        return save_to_json(self.iter_profiles(), filename, progress)
+
+    def close(self):
+        self.connection.close()
+
+
+class AutosaveStore(object):
+    """
+    Wraps a store so that saving never waits on the disk.  Changes are
+    queued with a copy of the profile as it was when saved, repeated saves
+    of a profile replace each other in the queue, and a background thread
+    hands the queue to the store in one go once no change has come for
+    delay seconds (or max_delay after the oldest unsaved change, so steady
+    editing is still saved).  close() saves whatever is queued.
+
+    While idle the thread also asks the store every poll seconds for the
+    changes other instances made, which take_changes() hands over.
+    """
+    def __init__(self, store, delay=AUTOSAVE_DELAY,
+                 max_delay=AUTOSAVE_MAX_DELAY, poll=AUTOSAVE_POLL):
+        self.store = store
+        self.delay = delay
+        self.max_delay = max_delay
+        self.poll = poll
+        self.condition = threading.Condition()
+        self.pending = []
+        self.pending_puts = {}
+        self.first_change = None
+        self.last_change = None
+        self.writing = False
+        self.writing_names = set()
+        self.incoming = []
+        self.conflicts = set()
+        self.closing = False
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def load(self):
+        with self.condition:
+            self.incoming = []
+            self.conflicts = set()
+        return self.store.load()
+
+    def put(self, profile):
+        """Queue saving a profile; saves already queued for it are replaced."""
+        snapshot = copy.deepcopy(profile)
+        with self.condition:
+            record = self.pending_puts.get(profile['name'])
+            if record is not None:
+                record['profile'] = snapshot
+            else:
+                record = {'op': 'put', 'profile': snapshot}
+                self.pending_puts[profile['name']] = record
+                self.pending.append(record)
+            self.changed()
+
+    def delete(self, name):
+        with self.condition:
+            self.pending_puts.pop(name, None)
+            self.pending.append({'op': 'delete', 'name': name})
+            self.changed()
+
+    def rename(self, name, new_name):
+        with self.condition:
+            # Later saves must come after the rename, so start a new record
+            self.pending_puts.pop(name, None)
+            self.pending.append({'op': 'rename', 'name': name,
+                                 'new_name': new_name})
+            self.changed()
+
+    def changed(self):
+        now = time.monotonic()
+        if self.first_change is None:
+            self.first_change = now
+        self.last_change = now
+        self.condition.notify()
+
+    def dirty(self):
+        """Return True if changes are waiting to be saved."""
+        with self.condition:
+            return bool(self.pending) or self.writing
+
+    def take_changes(self):
+        """
+        Return (records, conflicts): the records written by other instances
+        since the last call, to be applied to what is shown, and the names
+        of profiles they changed that were also changed here.  Where both
+        changed a profile the change made here is the one kept, on disk and
+        on screen, so records for those profiles are left out.
+        """
+        with self.condition:
+            local = record_names(self.pending)
+            if self.writing:
+                local |= self.writing_names
+            records = []
+            for record in self.incoming:
+                names = record_names([record])
+                if names & local:
+                    self.conflicts |= names
+                else:
+                    records.append(record)
+            conflicts = self.conflicts
+            self.incoming = []
+            self.conflicts = set()
+            return records, conflicts
+
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if self.pending:
+                        if self.closing:
+                            break
+                        now = time.monotonic()
+                        wait = min(self.last_change + self.delay,
+                                   self.first_change + self.max_delay) - now
+                        if wait <= 0:
+                            break
+                        self.condition.wait(wait)
+                    elif self.closing:
+                        return
+                    elif not self.condition.wait(self.poll):
+                        break  # Idle: look for other instances' changes
+                records = self.pending
+                self.pending = []
+                self.pending_puts = {}
+                self.first_change = self.last_change = None
+                self.writing = bool(records)
+                self.writing_names = record_names(records)
+            try:
+                if records:
+                    changes = self.store.apply(records)
+                else:
+                    changes = self.store.sync()
+                error = None
+            except Exception as exception:
+                changes = None
+                error = exception
+            with self.condition:
+                self.writing = False
+                self.error = error
+                # Changes read before writing ours, to profiles we have just
+                # written, were overwritten by ours
+                for record in changes or ():
+                    names = record_names([record])
+                    if names & self.writing_names:
+                        self.conflicts |= names
+                    else:
+                        self.incoming.append(record)
+                if error is not None and records:
+                    # Keep the changes to try again, ahead of newer ones
+                    self.pending[:0] = records
+                    self.pending_puts = {}
+                    self.first_change = self.last_change = time.monotonic()
+                    if self.closing:
+                        self.condition.notify_all()
+                        return
+                self.condition.notify_all()
+
+    def flush(self):
+        """Save everything queued now, and wait for it to be written."""
+        with self.condition:
+            if self.pending:
+                self.first_change = time.monotonic() - self.max_delay
+                self.condition.notify_all()
+            while (self.pending or self.writing) and self.error is None:
+                self.condition.wait()
+            if self.error is not None:
+                raise self.error
+
+    def close(self):
+        """Save everything queued, then close the store."""
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        self.store.close()
+
+
+def record_names(records):
+    """Return the names of the profiles journal records change."""
+    names = set()
+    for record in records:
+        if record['op'] == 'put':
+            names.add(record['profile']['name'])
+        elif record['op'] == 'delete':
+            names.add(record['name'])
+        elif record['op'] == 'rename':
+            names.add(record['name'])
+            names.add(record['new_name'])
+    return names
+
+
+def open_profiles(filename, progress=None):
+    """Yield the profiles in a JSON, JSON Lines or SQLite (.db) file."""
+    if filename.endswith(".db"):
+        store = SQLiteProfileStore(filename)
+        try:
+            yield from store.iter_profiles()
+        finally:
+            store.close()
+    else:
+        yield from iter_profiles(filename, progress)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Copy profiles between JSON, JSON Lines (.jsonl) and "
+                    "SQLite (.db) files, one profile at a time.")
+    parser.add_argument("source")
+    parser.add_argument("destination")
+    args = parser.parse_args()
+
+    def progress(done, total):
+        print(f"\r{done * 100 // max(total, 1)}%", end="", flush=True)
+
+    profiles = open_profiles(args.source, progress)
+    if args.destination.endswith(".db"):
+        store = SQLiteProfileStore(args.destination)
+        count = store.import_profiles(profiles)
+        store.close()
+    else:
+        count = save_to_json(profiles, args.destination)
+    print(f"\r{count} profiles copied to {args.destination}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Headless benchmark of the renderer in engine.py, in every mode built on it.
+
+Each mode renders the same walk through a seeded random map of its own
+kind: the player moves and turns a little every frame, so the frames
+differ the way they do in play.  The time of every frame is measured and
+the mean, 95th percentile and worst frame are reported per mode, with the
+mean number of rays cast per frame.
+
+    python raycast_bench.py
+    python raycast_bench.py --modes vary_height --frames 300 --rain
+    python raycast_bench.py --adaptive
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import argparse
+import pygame as pg
+
+import engine
+import raycast
+import raycast_vary_height
+
+
+MODES = {
+    "raycast": raycast.MODE,
+    "vary_height": raycast_vary_height.MODE,
+}
+MAP_SIZE = 32
+MAP_SEED = 1
+START = (15.5, 15.5, 0.0)
+
+
+def walk(frames):
+    """
+    Yield the (x, y, direction) of the player for every frame: turning in
+    place for a while, then circling the middle of the map.
+    """
+    x, y, direction = START
+    for frame in range(frames):
+        if frame < frames // 4:
+            yield x, y, direction + engine.CIRCLE * frame / (frames // 4)
+        else:
+            angle = engine.CIRCLE * frame / float(frames)
+            yield (x + 6 * math.cos(angle), y + 6 * math.sin(angle),
+                   angle + math.pi / 2)
+
+
+def percentile(times, fraction):
+    ordered = sorted(times)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_mode(mode, args):
+    """
+    Return the render time of every frame of the walk, in seconds, and the
+    number of rays cast for each.
+    """
+    screen = pg.display.get_surface()
+    engine.IMAGES = engine.load_resources(mode)
+    random.seed(MAP_SEED)
+    game_map = mode.make_map(MAP_SIZE)
+    game_map.place_lights(args.lights)
+    camera = engine.Camera(screen, args.resolution)
+    camera.rain = args.rain
+    camera.adaptive = args.adaptive
+    random.seed(0)
+    times = []
+    rays = []
+    for x, y, direction in walk(args.frames):
+        player = engine.Player(x, y, direction)
+        start = time.perf_counter()
+        camera.render(player, game_map, [])
+        times.append(time.perf_counter() - start)
+        rays.append(camera.rays_cast)
+    return times, rays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES),
+                        default=sorted(MODES))
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--resolution", type=int, default=300,
+                        help="rays cast per frame")
+    parser.add_argument("--rain", action="store_true")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="use adaptive column casting")
+    parser.add_argument("--lights", type=int, default=0,
+                        help="point lights baked into the map")
+    args = parser.parse_args()
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pg.init()
+    pg.display.set_mode(engine.SCREEN_SIZE)
+    print("{:<12} {:>7} {:>10} {:>10} {:>10} {:>8} {:>6}".format(
+        "mode", "frames", "mean", "p95", "worst", "fps", "rays"))
+    for name in args.modes:
+        times, rays = bench_mode(MODES[name], args)
+        mean = sum(times) / len(times)
+        print("{:<12} {:>7} {:>7.2f} ms {:>7.2f} ms {:>7.2f} ms {:>8.1f} "
+              "{:>6.0f}".format(name, len(times), mean * 1000,
+                                percentile(times, 0.95) * 1000,
+                                max(times) * 1000, 1 / mean,
+                                sum(rays) / float(len(rays))))
+    pg.quit()
+    sys.exit()
+
+
+if __name__ == "__main__":
+    main()
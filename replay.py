@@ -0,0 +1,128 @@
+"""
+Recording and playback of input sessions.
+
+A recording holds everything needed to reproduce a run of raycast.py:
+the seed used for the random module, and for every frame the state of the
+movement keys and the dt that the frame was updated with, in whole
+milliseconds.  While recording, the game rounds each dt with recorded_dt()
+before using it, so a replay updates with exactly the same values as the
+session did.
+
+File layout (little endian):
+    header:  magic (4s), version (B), seed (Q), key count (B),
+             key codes (key count * I)
+    frames:  dt in milliseconds (H), key bits (B * ceil(key count/8))
+"""
+
+import struct
+import zlib
+
+import pygame as pg
+
+
+MAGIC = b"SWRP"
+VERSION = 1
+HEADER = struct.Struct("<4sBQB")
+KEY_CODE = struct.Struct("<I")
+FRAME_DT = struct.Struct("<H")
+MAX_DT_MS = 0xFFFF
+
+# The only keys Player.update() looks at.
+TRACKED_KEYS = (pg.K_LEFT, pg.K_RIGHT, pg.K_UP, pg.K_DOWN)
+
+
+def dt_milliseconds(dt):
+    """Return a dt in seconds as the whole milliseconds recorded for it."""
+    return min(int(round(dt*1000)), MAX_DT_MS)
+
+
+def recorded_dt(dt):
+    """Return a dt in seconds as it reads back from a recording."""
+    return dt_milliseconds(dt)/1000.0
+
+
+class KeyState(object):
+    """
+    A stand in for the sequence returned by pg.key.get_pressed().
+    Indexing with a tracked key code gives its recorded state; any other
+    key reads as not pressed.
+    """
+    def __init__(self, pressed):
+        self.pressed = frozenset(pressed)
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+class InputRecorder(object):
+    """Writes the per-frame input of a session to a recording file."""
+    def __init__(self, filename, seed, keys=TRACKED_KEYS):
+        self.keys = tuple(keys)
+        self.mask_size = (len(self.keys)+7)//8
+        self.frames = 0
+        self.file = open(filename, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed, len(self.keys)))
+        for key in self.keys:
+            self.file.write(KEY_CODE.pack(key))
+
+    def record(self, keys, dt):
+        """
+        Append one frame.  The keys argument is anything indexable by key
+        code (normally pg.key.get_pressed()) and dt is in seconds.
+        """
+        dt_ms = dt_milliseconds(dt)
+        bits = 0
+        for i, key in enumerate(self.keys):
+            if keys[key]:
+                bits |= 1 << i
+        self.file.write(FRAME_DT.pack(dt_ms))
+        self.file.write(bits.to_bytes(self.mask_size, "little"))
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+
+
+class InputReplay(object):
+    """
+    Reads a recording made by InputRecorder.  Iterating yields a
+    (KeyState, dt) pair for every recorded frame, with dt in seconds.
+    """
+    def __init__(self, filename):
+        with open(filename, "rb") as recording:
+            data = recording.read()
+        magic, version, self.seed, key_count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("{} is not an input recording.".format(filename))
+        if version != VERSION:
+            message = "Unsupported recording version {}.".format(version)
+            raise ValueError(message)
+        offset = HEADER.size
+        keys = []
+        for _ in range(key_count):
+            keys.append(KEY_CODE.unpack_from(data, offset)[0])
+            offset += KEY_CODE.size
+        self.keys = tuple(keys)
+        self.mask_size = (key_count+7)//8
+        frame_size = FRAME_DT.size+self.mask_size
+        self.frames = []
+        for start in range(offset, len(data)-frame_size+1, frame_size):
+            dt_ms = FRAME_DT.unpack_from(data, start)[0]
+            mask = data[start+FRAME_DT.size:start+frame_size]
+            self.frames.append((self.unpack_keys(mask), dt_ms/1000.0))
+
+    def unpack_keys(self, mask):
+        bits = int.from_bytes(mask, "little")
+        pressed = [key for i, key in enumerate(self.keys) if bits & (1 << i)]
+        return KeyState(pressed)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        return iter(self.frames)
+
+
+def frame_checksum(surface):
+    """Return a CRC32 of the pixels of a surface, for comparing frames."""
+    return zlib.crc32(pg.image.tostring(surface, "RGB")) & 0xFFFFFFFF
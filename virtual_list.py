@@ -0,0 +1,192 @@
+"""
+A Tk listbox that shows rows straight from a data source.
+
+tk.Listbox has to be given every row up front, which for tens of thousands
+of rows takes seconds and has to be redone whenever the data changes.
+VirtualListbox only puts the rows that fit in its window into the Listbox
+it wraps, asking the data source for them as it is scrolled, so the cost
+of showing it or changing a row does not depend on the number of rows.
+"""
+
+import tkinter as tk
+from tkinter import font as tkfont
+
+
+class VirtualListbox(tk.Frame):
+    """
+    A scrollable list of count() rows, where row(i) returns the text of row
+    i.  Indexes taken and returned by its methods are positions in the
+    whole list, not in the window.  The methods shared with tk.Listbox
+    (curselection, get, selection_set, activate, see) behave the same way,
+    and <<ListboxSelect>> is generated on the frame when the selection
+    changes.
+    """
+    def __init__(self, master, count, row, height=20, width=50):
+        tk.Frame.__init__(self, master)
+        self.count = count
+        self.row = row
+        self.rows = height
+        self.top = 0
+        self.selected = None
+        self.active = 0
+        self.listbox = tk.Listbox(self, height=height, width=width,
+                                  exportselection=False)
+        self.scrollbar = tk.Scrollbar(self, orient="vertical",
+                                      command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.listbox.bind("<<ListboxSelect>>", self.on_select)
+        self.listbox.bind("<Configure>", self.on_resize)
+        self.listbox.bind("<MouseWheel>", self.on_wheel)
+        self.listbox.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll(3))
+        self.listbox.bind("<Up>", lambda event: self.step(-1))
+        self.listbox.bind("<Down>", lambda event: self.step(1))
+        self.listbox.bind("<Prior>", lambda event: self.step(-self.rows))
+        self.listbox.bind("<Next>", lambda event: self.step(self.rows))
+        self.refresh()
+
+    # Drawing the window
+
+    def refresh(self):
+        """Redraw the rows in the window, e.g. after the data changed."""
+        total = self.count()
+        self.top = max(0, min(self.top, total - self.rows))
+        end = min(total, self.top + self.rows)
+        self.listbox.delete(0, tk.END)
+        if end > self.top:
+            self.listbox.insert(tk.END, *[self.row(i)
+                                          for i in range(self.top, end)])
+        self.show_selection()
+        if total:
+            self.scrollbar.set(self.top / total, end / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def show_selection(self):
+        self.listbox.selection_clear(0, tk.END)
+        if self.in_window(self.selected):
+            self.listbox.selection_set(self.selected - self.top)
+        if self.in_window(self.active):
+            self.listbox.activate(self.active - self.top)
+
+    def in_window(self, index):
+        if index is None:
+            return False
+        return self.top <= index < self.top + self.listbox.size()
+
+    # Telling the list about changes to the data
+
+    def row_inserted(self, index):
+        """A row was inserted into the data at index."""
+        if self.selected is not None and self.selected >= index:
+            self.selected += 1
+        if self.active >= index and self.count() > 1:
+            self.active += 1
+        self.refresh()
+
+    def row_deleted(self, index):
+        """The row at index was removed from the data."""
+        if self.selected == index:
+            self.selected = None
+        elif self.selected is not None and self.selected > index:
+            self.selected -= 1
+        if self.active > index:
+            self.active -= 1
+        self.refresh()
+
+    def row_changed(self, index):
+        """The text of the row at index changed; redraw only that row."""
+        if self.in_window(index):
+            local = index - self.top
+            self.listbox.delete(local)
+            self.listbox.insert(local, self.row(index))
+            self.show_selection()
+
+    # tk.Listbox compatible methods
+
+    def curselection(self):
+        return () if self.selected is None else (self.selected,)
+
+    def get(self, index):
+        """Return the text of a row; index may also be tk.ACTIVE."""
+        if index == tk.ACTIVE:
+            index = self.active
+        if 0 <= index < self.count():
+            return self.row(index)
+        return ""
+
+    def selection_set(self, index):
+        self.selected = index
+        self.show_selection()
+
+    def selection_clear(self):
+        self.selected = None
+        self.show_selection()
+
+    def activate(self, index):
+        self.active = index
+        self.show_selection()
+
+    def see(self, index):
+        """Scroll so that the row at index is in the window."""
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.rows:
+            self.top = index - self.rows + 1
+        else:
+            return
+        self.refresh()
+
+    def yview(self, *args):
+        """Scrollbar command: ("moveto", fraction) or ("scroll", n, what)."""
+        if args[0] == tk.MOVETO:
+            self.top = int(float(args[1]) * self.count())
+        elif args[0] == tk.SCROLL:
+            amount = int(args[1])
+            self.top += amount * self.rows if args[2] == tk.PAGES else amount
+        self.refresh()
+
+    # Event handlers
+
+    def on_select(self, event):
+        local = self.listbox.curselection()
+        if not local:
+            return
+        self.selected = self.active = self.top + local[0]
+        self.event_generate("<<ListboxSelect>>")
+
+    def on_resize(self, event):
+        """Fit as many rows as the listbox now has room for."""
+        linespace = tkfont.Font(font=self.listbox.cget("font")).metrics(
+            "linespace")
+        padding = 2 * (int(self.listbox.cget("borderwidth")) +
+                       int(self.listbox.cget("highlightthickness")))
+        line_height = linespace + 1 + 2 * int(self.listbox.cget(
+            "selectborderwidth"))
+        rows = max(1, (event.height - padding) // line_height)
+        if rows != self.rows:
+            self.rows = rows
+            self.refresh()
+
+    def on_wheel(self, event):
+        self.scroll(-1 if event.delta > 0 else 1)
+        return "break"
+
+    def scroll(self, amount):
+        self.top += amount
+        self.refresh()
+        return "break"
+
+    def step(self, amount):
+        """Move the selection by amount rows, scrolling to keep it shown."""
+        total = self.count()
+        if not total:
+            return "break"
+        start = self.active if self.selected is None else self.selected
+        index = max(0, min(total - 1, start + amount))
+        self.selected = self.active = index
+        self.see(index)
+        self.show_selection()
+        self.event_generate("<<ListboxSelect>>")
+        return "break"